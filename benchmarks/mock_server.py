@@ -0,0 +1,367 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+"""
+Local stand-in for a JitBit helpdesk, good enough to benchmark the client without a live server:
+
+    with MockJitBitServer(tickets=10000, latency=0.01, throttle_rate=0.02) as server:
+        api = JitBitAPI(server.url, server.username, server.password)
+
+Implements Authorization, Tickets, Ticket, Users, Assets, Categories, Companies, Stats, TicketCustomFields,
+UpdateTicket, SetCustomField, AddSubscriber, Attachment, AttachFile, CreateUser, UpdateUser and UserByEmail
+with generated data. Can also be run on its own, MockServerProcess does that for benchmarks:
+
+    python -m benchmarks.mock_server --port 8080 --latency 0.02
+"""
+
+ASSETS_PAGE_SIZE = 50
+
+
+def _ticket(ticket_id, payload_size):
+    return {
+        "IssueID": ticket_id,
+        "Subject": "Ticket %d" % ticket_id,
+        "Body": "x" * payload_size,
+        "StatusID": ticket_id % 3 + 1,
+        "Status": ["New", "In process", "Closed"][ticket_id % 3],
+        "CategoryID": ticket_id % 7 + 1,
+        "CompanyID": ticket_id % 50 + 1,
+        "UserID": ticket_id % 1000 + 1,
+        "AssignedToUserID": ticket_id % 20 + 1,
+        "Priority": ticket_id % 4 - 1,
+        "IssueDate": "2019-%02d-%02dT08:00:00" % (ticket_id % 12 + 1, ticket_id % 28 + 1),
+        "LastUpdated": "2020-%02d-%02dT10:00:00" % (ticket_id % 12 + 1, ticket_id % 28 + 1),
+        "Tags": [{"TagID": ticket_id % 5, "Name": "tag%d" % (ticket_id % 5)}],
+    }
+
+
+def _user(user_id):
+    return {"UserID": user_id, "Username": "user%d" % user_id, "Email": "user%d@example.com" % user_id,
+            "FirstName": "First%d" % user_id, "LastName": "Last%d" % user_id, "CompanyID": user_id % 50 + 1,
+            "IsAdmin": user_id <= 2, "IsTech": user_id <= 20}
+
+
+def _attachment(file_id, size):
+    return (b"%08d" % file_id) * (size // 8) + b"x" * (size % 8)
+
+
+def _existing_user_id(mock, email):
+    match = re.match(r"user(\d+)@example\.com$", email or "")
+    if match and 0 < int(match.group(1)) <= mock.users:
+        return int(match.group(1))
+    return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockJitBit/1.0"
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in separate writes, don't let Nagle delay the second one
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, value, conditional=False):
+        body = json.dumps(value).encode()
+        if not conditional or not self.server.mock.etags:
+            return self._send(200, body)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers={"ETag": etag})
+        self._send(200, body, headers={"ETag": etag})
+
+    def _handle(self, form):
+        mock = self.server.mock
+        mock.count_request()
+        if mock.latency:
+            time.sleep(mock.latency * random.uniform(0.5, 1.5))
+        if self.headers.get("Authorization") != mock.authorization:
+            return self._send(401, b"Unauthorized", "text/plain")
+        roll = random.random()
+        if roll < mock.throttle_rate:
+            return self._send(429, b"Too many requests", "text/plain", {"Retry-After": "0.05"})
+        if roll < mock.throttle_rate + mock.error_rate:
+            return self._send(500, b"<html><body>Server Error</body></html>", "text/html")
+        url = urlparse(self.path)
+        query = {key: values if len(values) > 1 else values[0] for key, values in parse_qs(url.query).items()}
+        query.update(form)
+        parts = url.path.split("/")
+        endpoint = parts[2].lower() if len(parts) > 2 else ""
+        handler = getattr(self, "_api_" + endpoint, None)
+        if handler is None:
+            return self._send(404, b"Not found", "text/plain")
+        handler(mock, query)
+
+    def do_GET(self):
+        if self.path == "/_mock/stats":
+            # not counted, MockServerProcess reads the counters of a server in another process here
+            mock = self.server.mock
+            return self._send_json({"requests": mock.requests, "uploaded_bytes": mock.uploaded_bytes})
+        self._handle({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            # only AttachFile posts multipart, it just needs the raw body
+            return self._handle({"body": body})
+        form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        self._handle(form)
+
+    def _api_authorization(self, mock, query):
+        self._send(200)
+
+    def _api_tickets(self, mock, query):
+        count = min(int(query.get("count") or 10), 100, mock.page_size or 100)
+        offset = int(query.get("offset") or 1)
+        updated_from = query.get("updatedFrom")
+        date_from, date_to = query.get("dateFrom"), query.get("dateTo")
+        if updated_from or date_from or date_to:
+            ids = [i for i in range(1, mock.tickets + 1)
+                   if _ticket(i, 0)["LastUpdated"][:10] >= (updated_from or "")
+                   and (date_from or "") <= _ticket(i, 0)["IssueDate"][:10] <= (date_to or "9")]
+            ids = ids[offset - 1:offset - 1 + count]
+        else:
+            ids = range(offset, min(offset + count, mock.tickets + 1))
+        self._send_json([_ticket(i, mock.payload_size) for i in ids])
+
+    def _api_ticket(self, mock, query):
+        if self.command == "POST":
+            return self._send(200, str(mock.tickets + 1).encode(), "text/plain")
+        ticket_id = int(query.get("id") or 0)
+        if not 0 < ticket_id <= mock.tickets:
+            return self._send(404, b"Ticket not found", "text/plain")
+        self._send_json(_ticket(ticket_id, mock.payload_size), conditional=True)
+
+    def _api_ticketcustomfields(self, mock, query):
+        ticket_id = int(query.get("id") or 0)
+        self._send_json([{"FieldID": field_id, "FieldName": "Field %d" % field_id, "Value": "%d-%d" % (ticket_id, field_id)}
+                         for field_id in range(1, 6)], conditional=True)
+
+    def _api_users(self, mock, query):
+        count = min(int(query.get("count") or 500), mock.page_size or sys.maxsize)
+        page = int(query.get("page") or 1)
+        start = (page - 1) * count + 1
+        self._send_json([_user(i) for i in range(start, min(start + count, mock.users + 1))])
+
+    def _api_assets(self, mock, query):
+        page = int(query.get("page") or 1)
+        count = min(ASSETS_PAGE_SIZE, mock.page_size or ASSETS_PAGE_SIZE)
+        start = (page - 1) * count + 1
+        self._send_json([{"ItemID": i, "ModelName": "Model %d" % (i % 10), "SerialNumber": "SN%08d" % i}
+                         for i in range(start, min(start + count, mock.assets + 1))])
+
+    def _api_categories(self, mock, query):
+        self._send_json([{"CategoryID": i, "Name": "Category %d" % i, "SectionID": i % 2} for i in range(1, 8)])
+
+    def _api_companies(self, mock, query):
+        self._send_json([{"CompanyID": i, "Name": "Company %d" % i} for i in range(1, 51)])
+
+    def _api_stats(self, mock, query):
+        self._send_json({"TotalTickets": mock.tickets, "OpenTickets": mock.tickets // 3})
+
+    def _api_updateticket(self, mock, query):
+        self._send(200)
+
+    def _api_setcustomfield(self, mock, query):
+        self._send(200)
+
+    def _api_addsubscriber(self, mock, query):
+        self._send(200)
+
+    def _api_attachment(self, mock, query):
+        body = _attachment(int(query.get("id") or 0), mock.attachment_size)
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if not match:
+            return self._send(200, body, "application/octet-stream")
+        start = int(match.group(1))
+        if start >= len(body):
+            return self._send(416, headers={"Content-Range": "bytes */%d" % len(body)})
+        self._send(206, body[start:], "application/octet-stream",
+                   {"Content-Range": "bytes %d-%d/%d" % (start, len(body) - 1, len(body))})
+
+    def _api_attachfile(self, mock, query):
+        body = query.get("body") or b""
+        if b'name="id"' not in body or b'name="file"' not in body:
+            return self._send(400, b"Missing id or file", "text/plain")
+        mock.count_upload(len(body))
+        self._send(200)
+
+    def _api_createuser(self, mock, query):
+        if _existing_user_id(mock, query.get("email")):
+            return self._send(500, b"<html><body>Server Error</body></html>", "text/html")
+        self._send(200, str(mock.users + 1).encode(), "text/plain")
+
+    def _api_updateuser(self, mock, query):
+        self._send(200)
+
+    def _api_userbyemail(self, mock, query):
+        user_id = _existing_user_id(mock, query.get("email"))
+        if not user_id:
+            return self._send(200, b"null")
+        self._send_json(_user(user_id))
+
+
+class MockJitBitServer(object):
+    def __init__(self, host="127.0.0.1", port=0, username="bench", password="bench", tickets=10000, users=2000,
+                 assets=500, payload_size=500, latency=0.0, error_rate=0.0, throttle_rate=0.0, etags=True,
+                 attachment_size=1024 * 1024, page_size=None):
+        """
+        :param port:            int     (optional) 0 picks a free port
+        :param tickets:         int     (optional) number of generated tickets. Default: 10000
+        :param users:           int     (optional) number of generated users. Default: 2000
+        :param assets:          int     (optional) number of generated assets. Default: 500
+        :param payload_size:    int     (optional) bytes of body text per ticket. Default: 500
+        :param latency:         float   (optional) mean server latency in seconds, +/- 50%. Default: 0
+        :param error_rate:      float   (optional) share of requests answered with a 500 HTML page. Default: 0
+        :param throttle_rate:   float   (optional) share of requests answered with a 429. Default: 0
+        :param etags:           bool    (optional) send ETags for Ticket and TicketCustomFields and answer
+                                        If-None-Match with 304. Default: True
+        :param attachment_size: int     (optional) bytes per generated attachment. Default: 1 MB
+        :param page_size:       int     (optional) most records per page of Tickets, Users and Assets, below
+                                        the API's own limits (100 tickets, 50 assets). Default: no extra cap
+        """
+        self.username = username
+        self.password = password
+        self.authorization = "Basic " + base64.b64encode(("%s:%s" % (username, password)).encode()).decode()
+        self.tickets = tickets
+        self.users = users
+        self.assets = assets
+        self.payload_size = payload_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.etags = etags
+        self.attachment_size = attachment_size
+        self.page_size = page_size
+        self.requests = 0
+        self.uploaded_bytes = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_upload(self, size):
+        with self._lock:
+            self.uploaded_bytes += size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class MockServerProcess(object):
+    """
+    MockJitBitServer running in a child process, so its handler threads don't compete with the benchmarked
+    client for the GIL. Has the attributes of MockJitBitServer the benchmarks use; requests and uploaded_bytes
+    are read from the server on every access.
+    """
+    username = "bench"
+    password = "bench"
+
+    def __init__(self, tickets=10000, payload_size=500, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 page_size=None):
+        self.tickets = tickets
+        self.arguments = ["--port", "0", "--tickets", str(tickets), "--payload-size", str(payload_size),
+                          "--latency", str(latency), "--error-rate", str(error_rate),
+                          "--throttle-rate", str(throttle_rate)]
+        if page_size:
+            self.arguments += ["--page-size", str(page_size)]
+        self.url = None
+        self._process = None
+
+    def _stats(self):
+        from urllib.request import urlopen
+
+        with urlopen(self.url + "/_mock/stats") as response:
+            return json.loads(response.read())
+
+    @property
+    def requests(self):
+        return self._stats()["requests"]
+
+    @property
+    def uploaded_bytes(self):
+        return self._stats()["uploaded_bytes"]
+
+    def start(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._process = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_server"] + self.arguments,
+                                         cwd=root, stdout=subprocess.PIPE, universal_newlines=True)
+        # the first line names the URL, the socket is listening by then
+        self.url = re.search(r"http://\S+", self._process.stdout.readline()).group(0)
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.wait()
+        self._process.stdout.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a mock JitBit API server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--payload-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=None)
+    args = parser.parse_args()
+    server = MockJitBitServer(port=args.port, tickets=args.tickets, payload_size=args.payload_size,
+                              latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                              page_size=args.page_size)
+    print("Mock JitBit API on %s (user %s, password %s)" % (server.url, server.username, server.password), flush=True)
+    server.start()._thread.join()
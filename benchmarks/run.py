@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_server import MockServerProcess
+from jitbit import JitBitAPI
+
+"""
+Offline benchmarks against benchmarks.mock_server. Run from the repository root:
+
+    python -m benchmarks.run                         # all scenarios
+    python -m benchmarks.run bulk_fetch crawl --latency 0.02 --output bench_results.json
+
+Every scenario reports requests/sec (as counted by the server), p50/p99 latency per API call and peak
+Python memory (tracemalloc). The mock server runs in a child process, so it neither competes with the client
+for the GIL nor shows up in the memory peak. Timings come from a first pass without tracemalloc, the memory
+peak from a second pass of the same scenario. With --output the results are appended to a JSON file and compared to the
+previous entry, so regressions between versions show up.
+"""
+
+
+class Recorder(object):
+    """
+    Hook collecting the raw latency of every API call.
+    """
+
+    def __init__(self):
+        self.latencies = []
+
+    def __call__(self, record):
+        self.latencies.append(record.latency)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def scenario_bulk_fetch(server, args, recorder):
+    """get_tickets_by_ids over --ids ticket IDs, --workers threads"""
+    with JitBitAPI(server.url, server.username, server.password, pool_maxsize=args.workers) as api:
+        api.add_hook(recorder)
+        ids = random.sample(range(1, server.tickets + 1), min(args.ids, server.tickets))
+        failures = sum(not result.ok for result in api.get_tickets_by_ids(ids, max_workers=args.workers))
+    return {"failures": failures}
+
+
+def scenario_crawl(server, args, recorder):
+    """iter_tickets over all tickets with prefetch"""
+    with JitBitAPI(server.url, server.username, server.password) as api:
+        api.add_hook(recorder)
+        tickets = sum(1 for _ in api.iter_tickets(statusId="", prefetch=True))
+    return {"tickets": tickets}
+
+
+def scenario_mixed(server, args, recorder):
+    """80% get_ticket_by_id, 10% get_categories, 10% update_ticket from --workers threads"""
+    def operation(i):
+        roll = random.random()
+        if roll < 0.8:
+            api.get_ticket_by_id(random.randint(1, server.tickets))
+        elif roll < 0.9:
+            api.get_categories()
+        else:
+            api.update_ticket(random.randint(1, server.tickets), statusId=2)
+
+    with JitBitAPI(server.url, server.username, server.password, pool_maxsize=args.workers) as api:
+        api.add_hook(recorder)
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(operation, range(args.ids)))
+    return {}
+
+
+def scenario_sync(server, args, recorder):
+    """--ids sequential get_ticket_by_id calls on JitBitAPI"""
+    with JitBitAPI(server.url, server.username, server.password) as api:
+        api.add_hook(recorder)
+        for ticket_id in range(1, args.ids + 1):
+            api.get_ticket_by_id(ticket_id)
+    return {}
+
+
+def scenario_async(server, args, recorder):
+    """--ids concurrent get_ticket_by_id calls on AsyncJitBitAPI, --workers in flight"""
+    from jitbit_async import AsyncJitBitAPI
+
+    async def run():
+        async with AsyncJitBitAPI(server.url, server.username, server.password, max_concurrency=args.workers) as api:
+            api.add_hook(recorder)
+            await asyncio.gather(*(api.get_ticket_by_id(i) for i in range(1, args.ids + 1)))
+
+    asyncio.run(run())
+    return {}
+
+
+_COLD_START = """
+import sys, time
+started = time.perf_counter()
+import jitbit
+imported = time.perf_counter()
+api = jitbit.JitBitAPI(sys.argv[1], sys.argv[2], sys.argv[3], check_credentials={"eager": True, "lazy": "lazy"}[sys.argv[4]])
+created = time.perf_counter()
+api.get_stats()
+print(imported - started, created - started, time.perf_counter() - started)
+"""
+
+
+def scenario_cold_start(server, args, recorder):
+    """import, constructor and first call in a fresh interpreter, eager vs lazy credential check (median of 5)"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    extra = {}
+    for mode in ("eager", "lazy"):
+        runs = [[float(value) for value in subprocess.check_output(
+            [sys.executable, "-c", _COLD_START, server.url, server.username, server.password, mode], env=env).split()]
+            for _ in range(5)]
+        for index, step in enumerate(("import", "constructor", "first_call")):
+            extra["%s_%s_ms" % (mode, step)] = round(statistics.median(run[index] for run in runs) * 1000, 2)
+    return extra
+
+
+SCENARIOS = {
+    "bulk_fetch": scenario_bulk_fetch,
+    "crawl": scenario_crawl,
+    "mixed": scenario_mixed,
+    "sync": scenario_sync,
+    "async": scenario_async,
+    "cold_start": scenario_cold_start,
+}
+
+
+def run_scenario(name, args):
+    recorder = Recorder()
+    with MockServerProcess(tickets=args.tickets, payload_size=args.payload_size, latency=args.latency,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                           page_size=args.page_size) as server:
+        random.seed(args.seed)
+        before = server.requests
+        started = time.perf_counter()
+        extra = SCENARIOS[name](server, args, recorder)
+        elapsed = time.perf_counter() - started
+        requests = server.requests - before
+        # tracemalloc slows down every allocation, so the memory peak gets a pass of its own
+        random.seed(args.seed)
+        tracemalloc.start()
+        SCENARIOS[name](server, args, Recorder())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {
+            "seconds": round(elapsed, 3),
+            "requests": requests,
+            "requests_per_second": round(requests / elapsed, 1),
+            "p50_ms": round(recorder.percentile(0.5) * 1000, 2) if recorder.latencies else None,
+            "p99_ms": round(recorder.percentile(0.99) * 1000, 2) if recorder.latencies else None,
+            "peak_memory_kb": peak // 1024,
+        }
+        result.update(extra)
+        return result
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(previous, current):
+    for name, result in current.items():
+        before = previous["results"].get(name)
+        if not before:
+            continue
+        change = (result["requests_per_second"] - before["requests_per_second"]) / before["requests_per_second"]
+        print("  %-12s %+.1f%% requests/sec vs %s" % (name, change * 100, previous["revision"] or "previous run"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JitBit client against a local mock server")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run, all by default: %s" % ", ".join(SCENARIOS))
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--ids", type=int, default=1000, help="ticket lookups per scenario")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--payload-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=None, help="cap the mock's pages below the API limits")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file the results are appended to")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: %s" % ", ".join(sorted(unknown)))
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        results[name] = run_scenario(name, args)
+        print("%-12s %s" % (name, json.dumps(results[name])))
+
+    if args.output:
+        history = []
+        if os.path.exists(args.output):
+            with open(args.output) as f:
+                history = json.load(f)
+        if history:
+            _compare(history[-1], results)
+        history.append({
+            "revision": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("scenarios", "output")},
+            "results": results,
+        })
+        with open(args.output, "w") as f:
+            json.dump(history, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
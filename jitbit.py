@@ -1,8 +1,20 @@
+import base64
+import hashlib
 import json
 import logging
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 
-import requests
-from requests.auth import HTTPBasicAuth
+from jitbit_cache import CachedResponse, endpoint_of
+from jitbit_metrics import RequestRecord, current_record, install_connect_timing
+from jitbit_stream import JSONArraySplitter, loads as json_loads
+from jitbit_throttle import RetryPolicy
+from jitbit_transfer import TRANSFER_CHUNK_SIZE, MultipartBody, content_range
 
 logger = logging.getLogger("jitbit")
 
@@ -23,8 +35,8 @@ UpdateTicket (POST)         update_ticket
 SetCustomField (POST)       set_custom_field_by_id
 Stats                       get_stats
 TicketCustomFields          get_ticket_custom_fields_by_id
-Attachment              
-AttachFile (POST)
+Attachment                  download_attachment, download_attachments
+AttachFile (POST)           attach_file, attach_files
 AddSubscriber (POST)        add_subscriber_by_id
 Categories                  get_categories
 TechsForCategory            get_techs_for_category
@@ -59,29 +71,401 @@ AddAssetToTicket (POST)
 
 
 
-class JitBitAPI(object):
-    def __init__(self, api_url, username, password):
-        self.api_url = api_url
-        self.authentication = HTTPBasicAuth(username, password)
 
-        if not self.test_credentials():
+
+# requests and asyncio are imported where they are first needed, "import jitbit" stays cheap for short-lived
+# processes and code that only builds URLs. Creating a JitBitAPI still imports requests, by far the largest part
+# of a cold start
+
+# the Assets method always returns pages of 50
+ASSETS_PAGE_SIZE = 50
+
+# bytes read per step when streaming a list response
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# set by BaseJitBitAPI.retrying_writes(), per thread and per asyncio task
+_write_retry_guard = ContextVar("jitbit_write_retry_guard", default=None)
+_ALWAYS = object()
+
+# GET methods that change data, retried like POSTs only inside retrying_writes()
+_WRITING_GETS = ("mergetickets", "addsubscriber")
+
+# conditional request headers of the call in progress, set by _call() when revalidating
+_request_headers = ContextVar("jitbit_request_headers", default=None)
+
+# check_credentials value deferring the check to the answer of the first request
+LAZY = "lazy"
+
+# answers meaning the credentials were rejected
+_AUTH_FAILED_STATUSES = (401, 403)
+
+# (get_tickets keyword, query parameter, default) in URL order, offset has to stay last, see _tickets_prefix
+_TICKET_FILTERS = (
+    ("mode", "mode", "all"),
+    ("categoryId", "categoryid", ""),
+    ("sectionId", "sectionId", ""),
+    ("statusId", "statusId", "1"),
+    ("fromuserId", "fromUserId", ""),
+    ("fromcompanyId", "fromCompanyId", ""),
+    ("handledbyuserId", "handledByUserID", ""),
+    ("tagname", "tagName", ""),
+    ("datefrom", "dateFrom", ""),
+    ("dateto", "dateTo", ""),
+    ("updatedfrom", "updatedFrom", ""),
+    ("updatedto", "updatedTo", ""),
+    ("count", "count", ""),
+    ("offset", "offset", "1"),
+)
+_TICKET_MODES = ("all", "unanswered", "unclosed", "handledbyme")
+
+_USER_LIST_MODES = ("all", "techs", "admins", "regular")
+
+
+@lru_cache(maxsize=256)
+def _tickets_prefix(filters):
+    """
+    Query string of get_tickets up to "offset=", built once per combination of filters. Paging only changes
+    the offset, so iter_tickets builds it once for all pages.
+
+    :param filters: tuple   (keyword, value) pairs, without offset
+    """
+    values = dict(filters)
+    assert values.get("mode", "all") in _TICKET_MODES, "mode must be one of %s" % list(_TICKET_MODES)
+    return "Tickets?" + "".join(["%s=%s&" % (parameter, values.get(keyword, default))
+                                 for keyword, parameter, default in _TICKET_FILTERS[:-1]]) + "offset="
+
+
+_TICKETS_DEFAULT_URL = _tickets_prefix(()) + "1"
+
+
+def _basic_auth_header(username, password):
+    # same encoding as requests' HTTPBasicAuth, without importing requests
+    if not isinstance(username, bytes):
+        username = username.encode("latin1")
+    if not isinstance(password, bytes):
+        password = password.encode("latin1")
+    return "Basic " + base64.b64encode(username + b":" + password).decode("ascii")
+
+
+def _cache_namespace(api_url, username, password):
+    # the credentials are part of every cache key, so a client with a wrong password never sees cached answers.
+    # A slow salted hash, as SQLiteCacheBackend keeps the keys on disk
+    digest = hashlib.pbkdf2_hmac("sha256", _basic_auth_header(username, password).encode("ascii"),
+                                 ("%s|%s" % (api_url, username)).encode("utf-8"), 10000)
+    return "%s|%s|%s" % (api_url, username, digest.hex()[:32])
+
+
+def write_json_atomic(path, value, indent=None):
+    """
+    Writes value as JSON to path + ".tmp" and renames it to path, so a crash never leaves a half-written
+    file behind. Used for the state and checkpoint files of the sync, user import and export.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(value, f, indent=indent)
+    os.replace(temp_path, path)
+
+
+def _network_errors(streaming=False):
+    """
+    The requests exceptions worth a retry, looked up only when an exception is being handled.
+    """
+    import requests
+
+    if streaming:
+        return requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError
+    return requests.ConnectionError, requests.Timeout
+
+
+def _parse_json(response):
+    if response.status_code != 200:
+        # don't let an HTML error page end up in the JSON decoder
+        raise JitBitAPIError(getattr(response, "url", "request"), response.status_code, response.content)
+    return json_loads(response.content)
+
+
+class JitBitAPIError(Exception):
+    """
+    Raised for a response that isn't the expected success answer.
+    """
+
+    def __init__(self, method, status_code, content):
+        super().__init__("%s failed, status: %d, content: %r" % (method, status_code, content[:200]))
+        self.method = method
+        self.status_code = status_code
+        self.content = content
+
+
+class BulkResult(namedtuple("BulkResult", ["id", "value", "error"])):
+    """
+    Outcome of one ID of a bulk call: value is the parsed response, error the exception if the call failed.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _parse_json_or_raise(name):
+    def parse(response):
+        if response.status_code == 200:
+            try:
+                return json_loads(response.content)
+            except ValueError:
+                pass
+        raise JitBitAPIError(name, response.status_code, response.content)
+    return parse
+
+
+def _unique(ids):
+    seen = set()
+    for id in ids:
+        if id not in seen:
+            seen.add(id)
+            yield id
+
+
+def _parse_json_or_none(name):
+    def parse(response):
+        if response.status_code == 200:
+            try:
+                return json_loads(response.content)
+            except ValueError:
+                pass
+        logger.critical('Failure for %s, status: %d, content: %s', name, response.status_code, response.content)
+    return parse
+
+
+def _parse_status_code(response):
+    return response.status_code
+
+
+class Paginator(object):
+    """
+    Yields the records of a paged list endpoint one at a time, so only one page (two with prefetch)
+    is held in memory. Iterate with "for" on JitBitAPI and with "async for" on AsyncJitBitAPI.
+
+    position is the offset/page the records currently being yielded came from. Pass it back as
+    the start of a new iterator to resume, the current page is then yielded again.
+    """
+
+    def __init__(self, fetch_page, start, page_size, step, prefetch=False, model=None):
+        """
+        :param fetch_page:  callable    takes a position, returns a list of records (or an awaitable of one)
+        :param start:       int         position of the first page
+        :param page_size:   int         records per full page, a shorter page is the last one
+        :param step:        int         how far position advances per page
+        :param prefetch:    bool        fetch the next page in the background while the current one is consumed
+        :param model:       class       (optional) jitbit_models.Model subclass to yield instead of dicts
+        """
+        self.fetch_page = fetch_page
+        self.position = start
+        self.page_size = page_size
+        self.step = step
+        self.prefetch = prefetch
+        self.model = model
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        try:
+            position = self.position
+            pending = None
+            while True:
+                records = pending.result() if pending else self.fetch_page(position)
+                pending = None
+                if not records:
+                    return
+                self.position = position
+                position += self.step
+                last = len(records) < self.page_size
+                if executor and not last:
+                    pending = executor.submit(self.fetch_page, position)
+                if self.model is not None:
+                    records = self.model.from_list(records)
+                yield from records
+                if last:
+                    return
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aiter__(self):
+        import asyncio
+
+        position = self.position
+        pending = None
+        try:
+            while True:
+                records = await (pending or self.fetch_page(position))
+                pending = None
+                if not records:
+                    return
+                self.position = position
+                position += self.step
+                last = len(records) < self.page_size
+                if self.prefetch and not last:
+                    pending = asyncio.ensure_future(self.fetch_page(position))
+                if self.model is not None:
+                    records = self.model.from_list(records)
+                for record in records:
+                    yield record
+                if last:
+                    return
+        finally:
+            if pending:
+                pending.cancel()
+
+
+class BaseJitBitAPI(object):
+    """
+    Builds the requests and parses the responses for every API method. Subclasses only provide the transport:
+    _call() sends a request and feeds the response into a parser. JitBitAPI returns the parsed value directly,
+    AsyncJitBitAPI returns a coroutine resolving to it.
+    """
+
+    cache = None
+    revalidation = None
+    rate_limiter = None
+    retry = None
+    circuit_breaker = None
+    hooks = ()
+    # set for check_credentials="lazy" until a request got an answer
+    _credentials_pending = False
+
+    def _call(self, method, parse, data=None):
+        raise NotImplementedError
+
+    def _stream(self, method):
+        raise NotImplementedError
+
+    def add_hook(self, hook):
+        """
+        :param hook:    callable    called with a jitbit_metrics.RequestRecord after every API call,
+                                    e.g. a jitbit_metrics.MetricsCollector
+        """
+        # copy on write, so requests running in other threads iterate over a stable list
+        self.hooks = list(self.hooks) + [hook]
+
+    def remove_hook(self, hook):
+        self.hooks = [registered for registered in self.hooks if registered is not hook]
+
+    def _start_record(self, method, data):
+        record = RequestRecord(method, "POST" if data else "GET")
+        return record, current_record.set(record)
+
+    def _finish_record(self, record, token, method, data, response):
+        current_record.reset(token)
+        record.finish()
+        if response is not None:
+            record.status = response.status_code
+            record.response_bytes = len(response.content or b"")
+        if self.cache is not None and not data and self.cache.ttl_for(method):
+            record.cache = "hit" if isinstance(response, CachedResponse) else "miss"
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception:
+                logger.exception("JitBit request hook %r failed", hook)
+
+    def _verify_credentials(self, status_code):
+        """
+        Settles the check of a client created with check_credentials="lazy" with the status of an answer, from
+        any kind of request: 401 and 403 mean the credentials are wrong, a 5xx leaves the check to the next
+        answer, anything else proves them.
+        """
+        if status_code in _AUTH_FAILED_STATUSES:
             logger.error("Authorization failed for JitBit API")
             raise ValueError("Authorization failed, please check your credentials")
+        if status_code < 500:
+            self._credentials_pending = False
 
-    def _make_request(self, method, data=None):
+    @contextmanager
+    def retrying_writes(self, guard=None):
         """
-        :param method:  string  API method listed above
-        :param data:    dict    Dictionary with POST-Data
-        :return:
+        Lets writes sent in this block (thread / asyncio task) be retried like reads: POSTs and the GETs that
+        change data, MergeTickets and AddSubscriber. Only use it for writes that are safe to send twice, or
+        pass a guard.
+
+        :param guard:   callable    (optional) called as guard(method, data) before every retry of a write,
+                                    return False when the failed attempt went through after all
         """
-        url = "%s/api/%s" % (self.api_url, method)
-        if data:
-            return requests.post(url, data=data, auth=self.authentication)
-        return requests.get(url, auth=self.authentication)
+        token = _write_retry_guard.set(guard or _ALWAYS)
+        try:
+            yield
+        finally:
+            _write_retry_guard.reset(token)
+
+    @contextmanager
+    def _circuit_trial(self):
+        """
+        Checks the circuit breaker for one attempt. If the attempt is the trial and leaves the block without an
+        outcome booked, e.g. on a ValueError from the credential check, the trial is handed back.
+        """
+        if self.circuit_breaker is None:
+            yield
+            return
+        trial = self.circuit_breaker.check()
+        try:
+            yield
+        finally:
+            if trial is not None:
+                self.circuit_breaker.end_trial(trial)
+
+    def _book_outcome(self, status):
+        """
+        Feeds the outcome of one attempt to the circuit breaker and the rate limiter.
+
+        :param status:  int     HTTP status, None for a connection error
+        :return:        bool    True if the attempt failed
+        """
+        failed = status is None or status == 429 or status >= 500
+        if self.circuit_breaker is not None:
+            if failed:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+        if self.rate_limiter is not None:
+            if status == 429:
+                self.rate_limiter.penalize()
+            elif not failed:
+                self.rate_limiter.reward()
+        return failed
+
+    def _retry_delay(self, method, data, attempt, response=None, error=None):
+        """
+        Books the outcome of one attempt with the circuit breaker and rate limiter and decides about a retry.
+
+        :return:    float   seconds to wait before the next attempt, None to give up
+        """
+        status = response.status_code if response is not None else None
+        failed = self._book_outcome(status)
+        retry = self.retry
+        if not failed or retry is None or attempt >= retry.max_retries:
+            return None
+        if response is not None and status not in retry.retry_statuses:
+            return None
+        if data or endpoint_of(method) in _WRITING_GETS:
+            guard = _write_retry_guard.get()
+            if guard is None or (guard is not _ALWAYS and not guard(method, data)):
+                return None
+        delay = retry.delay(attempt, response.headers.get("Retry-After") if response is not None else None)
+        logger.warning("JitBit %s failed (%s), retry %d in %.2fs", method.split("?", 1)[0], error or status,
+                       attempt + 1, delay)
+        return delay
+
+    def invalidate_cache(self, endpoint=None):
+        """
+        Drops this client's cached responses.
+
+        :param endpoint:    string  (optional) only those of one endpoint, e.g. "Companies"
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.cache_namespace, endpoint)
 
     def test_credentials(self):
-        response = self._make_request("Authorization")
-        return response.status_code == 200
+        return self._call("Authorization", lambda response: response.status_code == 200)
 
     def get_tickets(self, *args, **kwargs):
         """
@@ -114,50 +498,30 @@ class JitBitAPI(object):
                                                         the first 20. Defalut: 0.
         :return: JSON with found tickets
         """
-        data = {}
-        data["mode"] = kwargs.get('mode', 'all')
-        data["categoryid"] = kwargs.get('categoryId', '')
-        data["sectionid"] = kwargs.get('sectionId', '')
-        data["statusid"] = kwargs.get('statusId', '1')
-        data["fromuserid"] = kwargs.get('fromuserId', '')
-        data["fromcompanyid"] = kwargs.get('fromcompanyId', '')
-        data["handledbyuserid"] = kwargs.get('handledbyuserId', '')
-        data["tagname"] = kwargs.get('tagname', '')
-        data["datefrom"] = kwargs.get('datefrom', '')
-        data["dateto"] = kwargs.get('dateto', '')
-        data["updatedfrom"] = kwargs.get('updatedfrom', '')
-        data["updatedto"] = kwargs.get('updatedto', '')
-        data["count"] = kwargs.get('count', '')
-        data["offset"] = kwargs.get('offset', '1')
-        modes = ["all", "unanswered", "unclosed", "handledbyme"]
-        assert data["mode"] in modes, "mode must be one of %s" % modes
-        assert int(data['offset']) > 0, "Offset count is 1-based"
-
-        url = (f"Tickets?mode={data['mode']}&"
-               f"categoryid={data['categoryid']}&"
-               f"sectionId={data['sectionid']}&"
-               f"statusId={data['statusid']}&"
-               f"fromUserId={data['fromuserid']}&"
-               f"fromCompanyId={data['fromcompanyid']}&"
-               f"handledByUserID={data['handledbyuserid']}&"
-               f"tagName={data['tagname']}&"
-               f"dateFrom={data['datefrom']}&"
-               f"dateTo={data['dateto']}&"
-               f"updatedFrom={data['updatedfrom']}&"
-               f"updatedTo={data['updatedto']}&"
-               f"count={data['count']}&"
-               f"offset={data['offset']}")
-        response = self._make_request(url)
-        return json.loads(response.content)
+        return self._call(self._tickets_url(**kwargs), _parse_json)
+
+    def stream_tickets(self, **kwargs):
+        """
+        Same as get_tickets, but yields the tickets one by one while the response is still downloading.
+        """
+        return self._stream(self._tickets_url(**kwargs))
+
+    @staticmethod
+    def _tickets_url(**kwargs):
+        if not kwargs:
+            return _TICKETS_DEFAULT_URL
+        offset = kwargs.pop("offset", "1")
+        assert int(offset) > 0, "Offset count is 1-based"
+        filters = tuple(kwargs.items())
+        try:
+            prefix = _tickets_prefix(filters)
+        except TypeError:
+            # unhashable filter value, build it without the cache
+            prefix = _tickets_prefix.__wrapped__(filters)
+        return prefix + str(offset)
 
     def get_ticket_by_id(self, id):
-        response = self._make_request("Ticket?id=%s" % id)
-        if response.status_code == 200:
-            try:
-                return json.loads(response.content)
-            except ValueError:
-                pass
-        logger.critical('Failure for get_ticket, status: %d, content: %s', response.status_code, response.content)
+        return self._call("Ticket?id=%s" % id, _parse_json_or_none("get_ticket"))
 
     def create_ticket(self, categoryId, body, subject, priorityId, userId, tags):
         """
@@ -186,20 +550,22 @@ class JitBitAPI(object):
             data["userId"] = userId
         if tags:
             data["tags"] = tags
-        response = self._make_request("Ticket", data=data)
-        if response.status_code == 200:
-            # there's no good way to differentiate between success and failure with this API
-            try:
-                jitbit_ticket_id = int(response.content)
-                logger.info("Ticket created: %d", jitbit_ticket_id)
-                return jitbit_ticket_id
-            except TypeError:
-              pass
-            except ValueError:
-                pass
-        else:
-            logger.critical("JitBit ticket creation failed, response was %s %d", response.content, response.status_code)
-        return None
+
+        def parse(response):
+            if response.status_code == 200:
+                # there's no good way to differentiate between success and failure with this API
+                try:
+                    jitbit_ticket_id = int(response.content)
+                    logger.info("Ticket created: %d", jitbit_ticket_id)
+                    return jitbit_ticket_id
+                except TypeError:
+                    pass
+                except ValueError:
+                    pass
+            else:
+                logger.critical("JitBit ticket creation failed, response was %s %d", response.content, response.status_code)
+            return None
+        return self._call("Ticket", parse, data=data)
 
     def get_users(self, count=500, page=1, list_mode="all"):
         """
@@ -215,21 +581,22 @@ class JitBitAPI(object):
                                                     “regular”       - only regular users
         :return:            JSON with Users
         """
+        return self._call(self._users_url(count, page, list_mode), _parse_json)
+
+    def stream_users(self, count=500, page=1, list_mode="all"):
+        """
+        Same as get_users, but yields the users one by one while the response is still downloading.
+        """
+        return self._stream(self._users_url(count, page, list_mode))
+
+    @staticmethod
+    def _users_url(count, page, list_mode):
         assert page > 0, "Page count is 1-based"
-        modes = ["all", "techs", "admins", "regular"]
-        assert list_mode in modes, "list_mode must be one of %s" % modes
-        url = "Users?count=%d&page=%d&listMode=%s" % (count, page, list_mode)
-        response = self._make_request(url)
-        return json.loads(response.content)
+        assert list_mode in _USER_LIST_MODES, "list_mode must be one of %s" % list(_USER_LIST_MODES)
+        return "Users?count=%d&page=%d&listMode=%s" % (count, page, list_mode)
 
     def get_user_by_email(self, email):
-        response = self._make_request("UserByEmail?email=%s" % email)
-        if response.status_code == 200:
-            try:
-                return json.loads(response.content)
-            except ValueError:
-                pass
-        logger.critical('Failure for get_user_by_email, status: %d, content: %s', response.status_code, response.content)
+        return self._call("UserByEmail?email=%s" % email, _parse_json_or_none("get_user_by_email"))
 
     def create_user(self, username, password, email, first_name, last_name, company, department, phone="", location="", send_welcome_email=False):
         """
@@ -258,24 +625,25 @@ class JitBitAPI(object):
             "department": department,
             "sendWelcomeEmail": send_welcome_email
         }
-        response = self._make_request("CreateUser", data=data)
-        if response.status_code == 200:
-            # there's no good way to differentiate between success and failure with this API
-            try:
-                jitbit_user_id = int(response.content)
-                logger.info("JitBit user created for %s %s", first_name, last_name)
-                return jitbit_user_id
-            except TypeError:
 
-                pass
-            except ValueError:
-                pass
-        elif response.status_code == 500:
-            logger.critical("500 error at JitBit for %s %s, it may be the user already exists", first_name, last_name)
-        else:
-            logger.critical("JitBit user creation failed for %s %s, response was %s %d", first_name, last_name,
-                        response.content, response.status_code)
-        return None
+        def parse(response):
+            if response.status_code == 200:
+                # there's no good way to differentiate between success and failure with this API
+                try:
+                    jitbit_user_id = int(response.content)
+                    logger.info("JitBit user created for %s %s", first_name, last_name)
+                    return jitbit_user_id
+                except TypeError:
+                    pass
+                except ValueError:
+                    pass
+            elif response.status_code == 500:
+                logger.critical("500 error at JitBit for %s %s, it may be the user already exists", first_name, last_name)
+            else:
+                logger.critical("JitBit user creation failed for %s %s, response was %s %d", first_name, last_name,
+                            response.content, response.status_code)
+            return None
+        return self._call("CreateUser", parse, data=data)
 
     def update_user_by_id(self, user_id, username="", email="", first_name="", last_name="", company="", phone="", location="", password=None, notes="", department="", disabled=False):
         """
@@ -309,29 +677,33 @@ class JitBitAPI(object):
             data["password"] = password
         if notes:
             data["notes"] = notes
-        response = self._make_request("UpdateUser", data=data)
-        if response.status_code == 200:
-            logger.info("JitBit user updated for id %s, user %s, email %s", user_id, username, email)
-            return True
-        logger.critical("JitBit user update failed for id %s, response code was %d, %s", user_id, response.status_code,
-                    response.content)
-        return False
+
+        def parse(response):
+            if response.status_code == 200:
+                logger.info("JitBit user updated for id %s, user %s, email %s", user_id, username, email)
+                return True
+            logger.critical("JitBit user update failed for id %s, response code was %d, %s", user_id, response.status_code,
+                        response.content)
+            return False
+        return self._call("UpdateUser", parse, data=data)
 
     def get_companies(self):
-        response = self._make_request("Companies")
-        return json.loads(response.content)
+        return self._call("Companies", _parse_json)
 
     def get_categories(self):
-        response = self._make_request("categories")
-        return json.loads(response.content)
+        return self._call("categories", _parse_json)
 
     def get_articles(self):
-        response = self._make_request("Articles")
-        return json.loads(response.content)
+        return self._call("Articles", _parse_json)
+
+    def stream_articles(self):
+        """
+        Same as get_articles, but yields the articles one by one while the response is still downloading.
+        """
+        return self._stream("Articles")
 
     def get_article_by_id(self, article_id):
-        response = self._make_request("Article/%s" % article_id)
-        return json.loads(response.content)
+        return self._call("Article/%s" % article_id, _parse_json)
 
     def get_assets(self, *args, **kwargs):
         """
@@ -343,24 +715,34 @@ class JitBitAPI(object):
                         assignedToDepartmentId	optional	filter by assigned company ID
         :return: JSON
         """
+        def parse(response):
+            if response.status_code == 200:
+                return json_loads(response.content)
+            return False
+        return self._call(self._assets_url(**kwargs), parse)
+
+    def stream_assets(self, **kwargs):
+        """
+        Same as get_assets, but yields the assets one by one while the response is still downloading.
+        """
+        return self._stream(self._assets_url(**kwargs))
+
+    @staticmethod
+    def _assets_url(**kwargs):
         data = {}
         data["page"] = kwargs.get('page', '')
         data["assignedtouserid"] = kwargs.get('assignedtouserid', '')
         data["assignedtocompany"] = kwargs.get('assignedtocompany', '')
         data["assignedtodepartmentid"] = kwargs.get('assignedtodepartmentid', '')
-        url = ("Assets?page={data['page']}&"
-               "assignedToUserId={data['assignedtouserid']}&"
-               "assignedToCompanyId={data['assignedtocompany']}&"
-               "assignedToDepartmentId={data['assignedtodepartmentid']}"
-               )
-        response = self._make_request(url)
-        if response.status_code == 200:
-            return json.loads(response.content)
-        return False
+        return (f"Assets?page={data['page']}&"
+                f"assignedToUserId={data['assignedtouserid']}&"
+                f"assignedToCompanyId={data['assignedtocompany']}&"
+                f"assignedToDepartmentId={data['assignedtodepartmentid']}"
+                )
 
-    def update_ticket(self, *args, **kwargs):
+    def update_ticket(self, id, **kwargs):
         """
-        :param args: ---
+        :param id:  int     Ticket ID
         :param kwargs:
                         categoryId (optional)           int	Ticket category
                         priority (optional)	            int	Ticket priority. Values:
@@ -375,31 +757,24 @@ class JitBitAPI(object):
                         timeSpentInSeconds (optional)	int	        Time spent on the ticket
                         statusId (optional)	            int	        Ticket status ID. “Closed” id 3, “New” is 1, “In process” is 2. Check your custom status IDs in the admin area
                         tags (optional)	                int	        A comma-separated list of tags to apply to the ticket. Like tags=tag1,tag2,tag3. All existing tags will be removed
-        :return: 200 OK if there were no errors. Returns an error message otherwise.
+        :return: True if there were no errors, False otherwise
         """
-        data["categoryId"] = kwargs.get('categoryId', '')
-        data["priority"] = kwargs.get('priority', '')
-        data["date"] = kwargs.get('date', '')
-        data["userId"] = kwargs.get('userId', '')
-        data["dueDate"] = kwargs.get('dueDate', '')
-        data["assignedUserId"] = kwargs.get('assignedUserId', '')
-        data["timeSpentInSeconds"] = kwargs.get('timeSpentInSeconds', '')
-        data["statusId"] = kwargs.get('statusId', '')
-        data["tags"] = kwargs.get('tags', '')
-
-        url = ("UpdateTicket=categoryId={data['categoryId']}&"
-               "priority={data['priority']}&"
-               "date={data['date']}&"
-               "userId={data['userId']}&"
-               "dueDate={data['dueDate']}&"
-               "assignedUserId={data['assignedUserId']}&"
-               "timeSpentInSeconds={data['timeSpentInSeconds']}&"
-               "statusId={data['statusId']}&"
-               "tags={data['tags']}"
-                )
-        if response.status_code == 200:
-            return json.loads(response.content)
-        return False
+        assert id, "Must provide a ticket id"
+        fields = ["categoryId", "priority", "date", "userId", "dueDate", "assignedUserId", "timeSpentInSeconds",
+                  "statusId", "tags"]
+        # only send what was passed, an empty value would overwrite the field on the ticket
+        data = {"id": id}
+        for field in fields:
+            if field in kwargs:
+                data[field] = kwargs[field]
+
+        def parse(response):
+            if response.status_code == 200:
+                return True
+            logger.critical("JitBit ticket update failed for id %s, response code was %d, %s", id, response.status_code,
+                            response.content)
+            return False
+        return self._call("UpdateTicket", parse, data=data)
 
     def set_custom_field_by_id(self, ticketId, fieldId, value):
         """
@@ -409,25 +784,28 @@ class JitBitAPI(object):
         :return: 200 OK if there were no errors. Returns an error message otherwise.
         """
         assert all([ticketId, fieldId, value]), "Must provide values for ticketId, fieldId and value"
-
+        data = {}
         data["ticketId"] = ticketId
         data["fieldId"] = fieldId
         data["value"] = value
 
-        response = self._make_request("SetCustomField", data=data)
-        return response.status_code
+        return self._call("SetCustomField", _parse_status_code, data=data)
 
     def get_stats(self):
         """
         :return: JSON
         """
-        response = self._make_request("Stats")
-        return json.loads(response.content)
+        return self._call("Stats", _parse_json)
 
     def get_ticket_custom_fields_by_id(self, id):
         url = "TicketCustomFields?id=%s" % id
-        response = self._make_request(url)
-        return json.loads(response.content)
+        return self._call(url, _parse_json)
+
+    def _fetch_ticket(self, id):
+        return self._call("Ticket?id=%s" % id, _parse_json_or_raise("get_ticket"))
+
+    def _fetch_ticket_custom_fields(self, id):
+        return self._call("TicketCustomFields?id=%s" % id, _parse_json_or_raise("get_ticket_custom_fields"))
 
     def add_subscriber_by_id(self, ticketId, userId):
         """
@@ -438,8 +816,7 @@ class JitBitAPI(object):
         """
         assert all([ticketId, userId]), "Must provide values for ticketId and userId"
         url = "AddSubscriber?id=%d&userId=%d" % (ticketId, userId)
-        response = self._make_request(url)
-        return response.status_code
+        return self._call(url, _parse_status_code)
 
     def  get_techs_for_category(self, categoryId):
         """
@@ -447,8 +824,7 @@ class JitBitAPI(object):
         :return:            JSON with all possible assignees for a category
         """
         url = "TechsForCategory?id=%d" % categoryId
-        response = self._make_request(url)
-        return json.loads(response.content)
+        return self._call(url, _parse_json)
 
     def get_custom_fields_for_category(self, categoryId):
         """
@@ -456,8 +832,7 @@ class JitBitAPI(object):
         :return:            JSON with all possible assignees for a category
         """
         url = "CustomFieldsForCategory?id=%d" % categoryId
-        response = self._make_request(url)
-        return json.loads(response.content)
+        return self._call(url, _parse_json)
 
     def merge_tickets(self, id, id2):
         """
@@ -467,5 +842,398 @@ class JitBitAPI(object):
         """
         assert all([id, id2]), "two tickets need to be provided"
         url = "MergeTickets?id=%d&id2=%d" % (id,id2)
-        response = self._make_request(url)
-        return json.loads(response.content)
+        return self._call(url, _parse_json)
+
+    def iter_tickets(self, offset=1, count=100, prefetch=False, model=None, **kwargs):
+        """
+        :param offset:      int     (optional) offset to start from, e.g. a saved Paginator.position. Default: 1
+        :param count:       int     (optional) tickets per request. Default and max: 100
+        :param prefetch:    bool    (optional) fetch the next page while the current one is consumed
+        :param model:       class   (optional) yield jitbit_models instances, e.g. Ticket, instead of dicts
+        :param kwargs:              filters, see get_tickets
+        :return:                    Paginator yielding single tickets
+        """
+        assert 0 < count <= 100, "count must be between 1 and 100"
+        fetch_page = lambda position: self.get_tickets(offset=position, count=count, **kwargs)
+        return Paginator(fetch_page, offset, count, count, prefetch=prefetch, model=model)
+
+    def iter_users(self, list_mode="all", page=1, count=500, prefetch=False, model=None):
+        """
+        :param list_mode:   string  (optional) see get_users
+        :param page:        int     (optional) page to start from, e.g. a saved Paginator.position. Default: 1
+        :param count:       int     (optional) users per request. Default: 500
+        :param prefetch:    bool    (optional) fetch the next page while the current one is consumed
+        :param model:       class   (optional) yield jitbit_models instances, e.g. User, instead of dicts
+        :return:                    Paginator yielding single users
+        """
+        fetch_page = lambda position: self.get_users(count=count, page=position, list_mode=list_mode)
+        return Paginator(fetch_page, page, count, 1, prefetch=prefetch, model=model)
+
+    def iter_assets(self, page=1, prefetch=False, model=None, **kwargs):
+        """
+        :param page:        int     (optional) page to start from, e.g. a saved Paginator.position. Default: 1
+        :param prefetch:    bool    (optional) fetch the next page while the current one is consumed
+        :param model:       class   (optional) yield jitbit_models instances, e.g. Asset, instead of dicts
+        :param kwargs:              filters, see get_assets
+        :return:                    Paginator yielding single assets, a failed page raises JitBitAPIError
+        """
+        # not get_assets, its False for a failed page would look like the end of the list
+        fetch_page = lambda position: self._call(self._assets_url(page=position, **kwargs), _parse_json)
+        return Paginator(fetch_page, page, ASSETS_PAGE_SIZE, 1, prefetch=prefetch, model=model)
+
+
+class JitBitAPI(BaseJitBitAPI):
+    def __init__(self, api_url, username, password, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 connect_timeout=5, read_timeout=60, cache=None, rate_limiter=None, retry=RetryPolicy(),
+                 circuit_breaker=None, revalidation=None, adapter=None, check_credentials=True):
+        """
+        :param api_url:             string  Base URL of the helpdesk, e.g. https://helpdesk.example.com
+        :param username:            string  JitBit username
+        :param password:            string  JitBit password
+        :param pool_connections:    int     (optional) number of per-host connection pools to cache. Default: 10
+        :param pool_maxsize:        int     (optional) max. keep-alive connections kept per host. Default: 10
+        :param pool_block:          bool    (optional) wait for a free connection instead of opening
+                                            a throwaway one when the pool is exhausted. Default: False
+        :param connect_timeout:     float   (optional) seconds to wait for the TCP/TLS connect. Default: 5
+        :param read_timeout:        float   (optional) seconds to wait for the server to answer. Default: 60
+        :param cache:               ResponseCache   (optional) cache for reference data, see jitbit_cache
+        :param rate_limiter:        TokenBucket     (optional) shared request rate limit, see jitbit_throttle
+        :param retry:               RetryPolicy     (optional) retries for GETs, None disables them.
+                                                    Default: 3 retries on 429/5xx and connection errors
+        :param circuit_breaker:     CircuitBreaker  (optional) fail fast while the server is unhealthy
+        :param revalidation:        RevalidationCache   (optional) conditional re-reads of tickets and articles
+        :param adapter:             HTTPAdapter     (optional) connection pool shared with other clients, the
+                                                    pool_* arguments are ignored then
+        :param check_credentials:   bool    (optional) call test_credentials() right away. Default: True
+                                            "lazy" (jitbit.LAZY) skips that round trip, the answer to the
+                                            first request tells instead: a 401 or 403 raises ValueError then
+
+        The constructor imports requests (and builds its Session), which costs more than the credential check
+        on a nearby server; check_credentials="lazy" only saves the round trip.
+        """
+        self.api_url = api_url
+        self._credentials = (username, password)
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        self.revalidation = revalidation
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.cache_namespace = (_cache_namespace(api_url, username, password)
+                                if cache is not None or revalidation is not None else None)
+        self.session = self._create_session(username, password, pool_connections, pool_maxsize, pool_block, adapter)
+
+        if check_credentials == LAZY:
+            self._credentials_pending = True
+        elif check_credentials and not self.test_credentials():
+            self.close()
+            logger.error("Authorization failed for JitBit API")
+            raise ValueError("Authorization failed, please check your credentials")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def authentication(self):
+        from requests.auth import HTTPBasicAuth
+
+        return HTTPBasicAuth(*self._credentials)
+
+    @staticmethod
+    def _create_session(username, password, pool_connections, pool_maxsize, pool_block, adapter=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+            install_connect_timing(adapter)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # the header never changes, so encode it once instead of on every request
+        session.headers["Authorization"] = _basic_auth_header(username, password)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    def close(self):
+        """
+        Closes all pooled connections. The client can't be used afterwards.
+        """
+        self.session.close()
+
+    def _make_request(self, method, data=None):
+        """
+        :param method:  string  API method listed above
+        :param data:    dict    Dictionary with POST-Data
+        :return:
+        """
+        if not self.hooks:
+            response = self._dispatch(method, data)
+        else:
+            record, token = self._start_record(method, data)
+            response = None
+            try:
+                response = self._dispatch(method, data)
+            except Exception as error:
+                record.error = error
+                raise
+            finally:
+                self._finish_record(record, token, method, data, response)
+        # a cache hit says nothing about the credentials
+        if self._credentials_pending and not isinstance(response, CachedResponse):
+            self._verify_credentials(response.status_code)
+        return response
+
+    def _dispatch(self, method, data=None):
+        if self.cache is None:
+            return self._send(method, data)
+        if not data and self.cache.ttl_for(method):
+            return self.cache.fetch(self.cache_namespace, method, lambda: self._send(method))
+        response = self._send(method, data)
+        if response.status_code == 200:
+            self.cache.invalidate_after(self.cache_namespace, "POST" if data else "GET", method)
+        return response
+
+    def _send(self, method, data=None, stream=False):
+        attempt = 0
+        while True:
+            with self._circuit_trial():
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                try:
+                    response = self._send_once(method, data, stream)
+                except _network_errors() as error:
+                    delay = self._retry_delay(method, data, attempt, error=error)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(method, data, attempt, response=response)
+                    if delay is None:
+                        return response
+                    response.close()
+            time.sleep(delay)
+            attempt += 1
+            record = current_record.get()
+            if record is not None:
+                record.retries += 1
+
+    def _send_once(self, method, data=None, stream=False):
+        url = "%s/api/%s" % (self.api_url, method)
+        if stream:
+            return self.session.get(url, timeout=self.timeout, stream=True)
+        headers = _request_headers.get()
+        record = current_record.get()
+        if record is None:
+            if data:
+                return self.session.post(url, data=data, timeout=self.timeout)
+            return self.session.get(url, headers=headers, timeout=self.timeout)
+        # stream, so the wait for the headers and the body download can be timed separately
+        connect = record.connect
+        started = time.perf_counter()
+        if data:
+            response = self.session.post(url, data=data, timeout=self.timeout, stream=True)
+        else:
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        headers_received = time.perf_counter()
+        response.content
+        record.ttfb += headers_received - started - (record.connect - connect)
+        record.download += time.perf_counter() - headers_received
+        return response
+
+    def _call(self, method, parse, data=None):
+        if data or self.revalidation is None or not self.revalidation.handles(method):
+            return parse(self._make_request(method, data=data))
+        entry = self.revalidation.get(self.cache_namespace, method)
+        token = _request_headers.set(entry.conditional_headers() if entry is not None else None)
+        try:
+            response = self._make_request(method)
+        finally:
+            _request_headers.reset(token)
+        return self.revalidation.resolve(self.cache_namespace, method, entry, response, parse)
+
+    def _stream(self, method):
+        # streamed responses skip the cache and the request hooks
+        response = self._send(method, stream=True)
+        with response:
+            if self._credentials_pending:
+                self._verify_credentials(response.status_code)
+            if response.status_code != 200:
+                raise JitBitAPIError(response.url, response.status_code, response.content)
+            splitter = JSONArraySplitter()
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                yield from splitter.feed(chunk)
+            splitter.close()
+
+    def _bulk(self, fetch, ids, max_workers, ordered, window):
+        window = window or max_workers * 4
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
+            for id in _unique(ids):
+                in_flight.append((id, executor.submit(fetch, id)))
+                if len(in_flight) >= window:
+                    yield from self._bulk_drain(in_flight, ordered, everything=False)
+            yield from self._bulk_drain(in_flight, ordered, everything=True)
+
+    @staticmethod
+    def _bulk_drain(in_flight, ordered, everything):
+        while in_flight:
+            if ordered:
+                id, future = in_flight.popleft()
+                done = [(id, future)]
+            else:
+                wait([future for _, future in in_flight], return_when=FIRST_COMPLETED)
+                done = [item for item in in_flight if item[1].done()]
+                for item in done:
+                    in_flight.remove(item)
+            for id, future in done:
+                error = future.exception()
+                yield BulkResult(id, None if error else future.result(), error)
+            if not everything:
+                return
+
+    def get_tickets_by_ids(self, ids, max_workers=8, ordered=True, window=None):
+        """
+        :param ids:             iterable    ticket IDs, duplicates are fetched once
+        :param max_workers:     int         (optional) parallel requests. Default: 8
+        :param ordered:         bool        (optional) yield in input order, otherwise as completed. Default: True
+        :param window:          int         (optional) max. IDs submitted but not yet yielded. Default: 4 * max_workers
+        :return:                            generator of BulkResult(id, ticket, error)
+        """
+        return self._bulk(self._fetch_ticket, ids, max_workers, ordered, window)
+
+    def get_ticket_custom_fields_by_ids(self, ids, max_workers=8, ordered=True, window=None):
+        """
+        Same as get_tickets_by_ids, for get_ticket_custom_fields_by_id.
+        """
+        return self._bulk(self._fetch_ticket_custom_fields, ids, max_workers, ordered, window)
+
+    # attachment transfers stream from and to disk, they skip the cache and the request hooks
+
+    def download_attachment(self, file_id, path, progress=None, chunk_size=TRANSFER_CHUNK_SIZE):
+        """
+        Streams an attachment to disk. The data goes to path + ".part" first, an interrupted download
+        (connection lost, or a previous process died) continues from there with a Range request when the
+        server supports it, and starts over when it doesn't.
+
+        :param file_id:     int         attachment ID, see the Attachments of get_ticket_by_id
+        :param path:        string      file to write
+        :param progress:    callable    (optional) called as progress(bytes_written, total_bytes or None)
+        :param chunk_size:  int         (optional) bytes written per step. Default: 1 MB
+        :return:            string      path
+        """
+        method = "Attachment?id=%s" % file_id
+        url = "%s/api/%s" % (self.api_url, method)
+        part_path = path + ".part"
+        attempt = 0
+        while True:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            with self._circuit_trial():
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                try:
+                    with self.session.get(url, headers={"Range": "bytes=%d-" % offset} if offset else None,
+                                          timeout=self.timeout, stream=True) as response:
+                        status = response.status_code
+                        if self._credentials_pending:
+                            self._verify_credentials(status)
+                        if status == 416 and offset:
+                            self._book_outcome(status)
+                            if content_range(response)[1] == offset:
+                                # nothing left to send, the part file is complete
+                                break
+                            # longer than the attachment or no size given, the part file can't be trusted
+                            os.remove(part_path)
+                            continue
+                        if status in (200, 206):
+                            self._book_outcome(status)
+                            if status == 206:
+                                start, total = content_range(response)
+                                if start != offset:
+                                    # not the range that was asked for, start over without one
+                                    os.remove(part_path)
+                                    continue
+                            else:
+                                # Range not supported (or no part file yet), the full body follows
+                                offset = 0
+                                total = int(response.headers.get("Content-Length") or 0) or None
+                            with open(part_path, "ab" if offset else "wb") as f:
+                                for chunk in response.iter_content(chunk_size):
+                                    f.write(chunk)
+                                    offset += len(chunk)
+                                    if progress is not None:
+                                        progress(offset, total)
+                            break
+                        delay = self._retry_delay(method, None, attempt, response=response)
+                        if delay is None:
+                            raise JitBitAPIError(method, status, response.content)
+                except _network_errors(streaming=True) as error:
+                    delay = self._retry_delay(method, None, attempt, error=error)
+                    if delay is None:
+                        raise
+            time.sleep(delay)
+            attempt += 1
+        os.replace(part_path, path)
+        return path
+
+    def attach_file(self, ticket_id, file, filename=None, progress=None):
+        """
+        Uploads a file to a ticket as multipart/form-data, read from the file while it is sent. Uploads are
+        not retried, a failed attempt may still have attached the file.
+
+        :param ticket_id:   int         Ticket ID
+        :param file:        string or file opened in binary mode
+        :param filename:    string      (optional) name on the ticket. Default: the file's base name
+        :param progress:    callable    (optional) called as progress(bytes_sent, total_bytes)
+        :return:            True, raises JitBitAPIError when the server refuses the file
+        """
+        assert ticket_id, "Must provide a ticket id"
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "rb") as f:
+                return self.attach_file(ticket_id, f, filename, progress)
+        filename = filename or os.path.basename(getattr(file, "name", "") or "attachment")
+        body = MultipartBody({"id": ticket_id}, file, filename, progress)
+        with self._circuit_trial():
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.post("%s/api/AttachFile" % self.api_url, data=body,
+                                             headers={"Content-Type": body.content_type}, timeout=self.timeout)
+            except _network_errors():
+                self._book_outcome(None)
+                raise
+            self._book_outcome(response.status_code)
+        if self._credentials_pending:
+            self._verify_credentials(response.status_code)
+        if response.status_code != 200:
+            raise JitBitAPIError("AttachFile", response.status_code, response.content)
+        logger.info("Attached %s (%d bytes) to ticket %s", filename, body.file_size, ticket_id)
+        return True
+
+    def download_attachments(self, downloads, max_workers=4, progress=None, ordered=False):
+        """
+        :param downloads:   iterable    (file_id, path) pairs
+        :param max_workers: int         (optional) parallel transfers. Default: 4
+        :param progress:    callable    (optional) called as progress((file_id, path), bytes_written, total_bytes)
+        :param ordered:     bool        (optional) yield in input order, otherwise as completed. Default: False
+        :return:                        generator of BulkResult((file_id, path), path, error)
+        """
+        def download(item):
+            report = None if progress is None else lambda done, total: progress(item, done, total)
+            return self.download_attachment(item[0], item[1], report)
+        return self._bulk(download, ((file_id, path) for file_id, path in downloads), max_workers, ordered, None)
+
+    def attach_files(self, uploads, max_workers=4, progress=None, ordered=False):
+        """
+        :param uploads:     iterable    (ticket_id, file path) pairs
+        :param max_workers: int         (optional) parallel transfers. Default: 4
+        :param progress:    callable    (optional) called as progress((ticket_id, path), bytes_sent, total_bytes)
+        :param ordered:     bool        (optional) yield in input order, otherwise as completed. Default: False
+        :return:                        generator of BulkResult((ticket_id, path), True, error)
+        """
+        def upload(item):
+            report = None if progress is None else lambda done, total: progress(item, done, total)
+            return self.attach_file(item[0], item[1], progress=report)
+        return self._bulk(upload, ((ticket_id, path) for ticket_id, path in uploads), max_workers, ordered, None)
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+from time import perf_counter
+
+from jitbit import (LAZY, STREAM_CHUNK_SIZE, BaseJitBitAPI, BulkResult, JitBitAPIError, _basic_auth_header,
+                    _cache_namespace, _request_headers, _unique)
+from jitbit_cache import CachedResponse
+from jitbit_metrics import current_record
+from jitbit_stream import JSONArraySplitter
+from jitbit_throttle import RetryPolicy
+
+logger = logging.getLogger("jitbit")
+
+"""
+asyncio flavour of JitBitAPI. Every API method of JitBitAPI is available as a coroutine:
+
+    async with AsyncJitBitAPI(url, username, password, max_concurrency=50) as api:
+        tickets = await asyncio.gather(*(api.get_ticket_by_id(i) for i in ids))
+
+Requires aiohttp (pip install aiohttp).
+"""
+
+
+def _connect_timing():
+    import aiohttp
+
+    async def on_start(session, context, params):
+        context.connect_started = perf_counter()
+
+    async def on_end(session, context, params):
+        record = current_record.get()
+        if record is not None:
+            record.connect += perf_counter() - context.connect_started
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_start)
+    trace_config.on_connection_create_end.append(on_end)
+    return trace_config
+
+
+class AsyncResponse(object):
+    """
+    The parts of an aiohttp response the shared parsers need, already read, so they see the same
+    interface as a requests.Response.
+    """
+    __slots__ = ("status_code", "content", "headers", "url")
+
+    def __init__(self, status_code, content, headers, url):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.url = url
+
+
+class AsyncJitBitAPI(BaseJitBitAPI):
+    def __init__(self, api_url, username, password, max_concurrency=20, pool_maxsize=100, pool_maxsize_per_host=0,
+                 connect_timeout=5, read_timeout=60, cache=None, rate_limiter=None, retry=RetryPolicy(),
+                 circuit_breaker=None, revalidation=None, check_credentials=True):
+        """
+        :param api_url:                 string  Base URL of the helpdesk, e.g. https://helpdesk.example.com
+        :param username:                string  JitBit username
+        :param password:                string  JitBit password
+        :param max_concurrency:         int     (optional) max. requests in flight at the same time. Default: 20
+                                                Streams only count until their response headers arrive
+        :param pool_maxsize:            int     (optional) max. open connections in the pool. Default: 100
+        :param pool_maxsize_per_host:   int     (optional) max. open connections per host, 0 is unlimited. Default: 0
+        :param connect_timeout:         float   (optional) seconds to wait for the TCP/TLS connect. Default: 5
+        :param read_timeout:            float   (optional) seconds to wait for the server to answer. Default: 60
+        :param cache:                   ResponseCache   (optional) cache for reference data, see jitbit_cache
+        :param rate_limiter:            TokenBucket     (optional) shared request rate limit, see jitbit_throttle
+        :param retry:                   RetryPolicy     (optional) retries for GETs, None disables them
+        :param circuit_breaker:         CircuitBreaker  (optional) fail fast while the server is unhealthy
+        :param revalidation:            RevalidationCache   (optional) conditional re-reads of tickets and articles
+        :param check_credentials:       bool    (optional) let open() call test_credentials(). Default: True
+                                                "lazy" checks the answer to the first request instead, see JitBitAPI
+
+        The connection pool is opened lazily and the credentials are checked by open(), which
+        "async with" calls for you.
+        """
+        self.api_url = api_url
+        self.headers = {"Authorization": _basic_auth_header(username, password)}
+        self.max_concurrency = max_concurrency
+        self.pool_maxsize = pool_maxsize
+        self.pool_maxsize_per_host = pool_maxsize_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.cache = cache
+        self.revalidation = revalidation
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.cache_namespace = (_cache_namespace(api_url, username, password)
+                                if cache is not None or revalidation is not None else None)
+        self.check_credentials = check_credentials
+        self._credentials_pending = check_credentials == LAZY
+        self.session = None
+        self._semaphore = None
+        self._pending = {}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_session(self):
+        if self.session is None:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize, limit_per_host=self.pool_maxsize_per_host)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers,
+                                                 trace_configs=[_connect_timing()])
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def open(self):
+        """
+        Opens the connection pool and checks the credentials.
+        """
+        self._get_session()
+        if self.check_credentials and self.check_credentials != LAZY and not await self.test_credentials():
+            await self.close()
+            logger.error("Authorization failed for JitBit API")
+            raise ValueError("Authorization failed, please check your credentials")
+
+    async def close(self):
+        """
+        Closes all pooled connections.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _make_request(self, method, data=None):
+        """
+        :param method:  string  API method listed above
+        :param data:    dict    Dictionary with POST-Data
+        :return:        AsyncResponse
+        """
+        if not self.hooks:
+            response = await self._dispatch(method, data)
+        else:
+            record, token = self._start_record(method, data)
+            response = None
+            try:
+                response = await self._dispatch(method, data)
+            except Exception as error:
+                record.error = error
+                raise
+            finally:
+                self._finish_record(record, token, method, data, response)
+        # a cache hit says nothing about the credentials
+        if self._credentials_pending and not isinstance(response, CachedResponse):
+            self._verify_credentials(response.status_code)
+        return response
+
+    async def _dispatch(self, method, data=None):
+        if self.cache is None:
+            return await self._send(method, data)
+        if not data and self.cache.ttl_for(method):
+            return await self._fetch_cached(method)
+        response = await self._send(method, data)
+        if response.status_code == 200:
+            self.cache.invalidate_after(self.cache_namespace, "POST" if data else "GET", method)
+        return response
+
+    async def _fetch_cached(self, method):
+        content = self.cache.get(self.cache_namespace, method)
+        if content is not None:
+            return CachedResponse(content)
+        # concurrent misses on the same key share one request
+        pending = self._pending.get(method)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._pending[method] = asyncio.ensure_future(self._send(method))
+        try:
+            response = await asyncio.shield(pending)
+        finally:
+            del self._pending[method]
+        if response.status_code == 200:
+            self.cache.set(self.cache_namespace, method, response.content)
+        return response
+
+    async def _send(self, method, data=None):
+        import aiohttp
+
+        attempt = 0
+        while True:
+            with self._circuit_trial():
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire_async()
+                try:
+                    response = await self._send_once(method, data)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                    delay = self._retry_delay(method, data, attempt, error=error)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(method, data, attempt, response=response)
+                    if delay is None:
+                        return response
+            await asyncio.sleep(delay)
+            attempt += 1
+            record = current_record.get()
+            if record is not None:
+                record.retries += 1
+
+    async def _send_once(self, method, data=None):
+        session = self._get_session()
+        url = "%s/api/%s" % (self.api_url, method)
+        async with self._semaphore:
+            if data:
+                # requests sends str() of every value, do the same so both clients post identical forms
+                request = session.post(url, data={key: str(value) for key, value in data.items()})
+            else:
+                request = session.get(url, headers=_request_headers.get())
+            record = current_record.get()
+            if record is None:
+                async with request as response:
+                    return AsyncResponse(response.status, await response.read(), response.headers, url)
+            connect = record.connect
+            started = perf_counter()
+            async with request as response:
+                headers_received = perf_counter()
+                content = await response.read()
+                record.ttfb += headers_received - started - (record.connect - connect)
+                record.download += perf_counter() - headers_received
+                return AsyncResponse(response.status, content, response.headers, url)
+
+    async def _call(self, method, parse, data=None):
+        if data or self.revalidation is None or not self.revalidation.handles(method):
+            return parse(await self._make_request(method, data=data))
+        entry = self.revalidation.get(self.cache_namespace, method)
+        token = _request_headers.set(entry.conditional_headers() if entry is not None else None)
+        try:
+            response = await self._make_request(method)
+        finally:
+            _request_headers.reset(token)
+        return self.revalidation.resolve(self.cache_namespace, method, entry, response, parse)
+
+    async def _stream(self, method):
+        # streamed responses skip the cache and the request hooks
+        import aiohttp
+
+        session = self._get_session()
+        url = "%s/api/%s" % (self.api_url, method)
+        attempt = 0
+        while True:
+            with self._circuit_trial():
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire_async()
+                streaming = False
+                try:
+                    # the slot only covers opening the request, an open stream doesn't count: records are handed
+                    # out while it stays open and the caller may await other requests of this client meanwhile
+                    async with self._semaphore:
+                        response = await session.get(url)
+                    async with response:
+                        if self._credentials_pending:
+                            self._verify_credentials(response.status)
+                        if response.status == 200:
+                            self._book_outcome(200)
+                            streaming = True
+                            splitter = JSONArraySplitter()
+                            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                                for record in splitter.feed(chunk):
+                                    yield record
+                            splitter.close()
+                            return
+                        failed = AsyncResponse(response.status, await response.read(), response.headers, url)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                    # records already handed out can't be taken back, so only retry before the first one
+                    delay = None if streaming else self._retry_delay(method, None, attempt, error=error)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(method, None, attempt, response=failed)
+                    if delay is None:
+                        raise JitBitAPIError(url, failed.status_code, failed.content)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _bulk(self, fetch, ids, ordered, window):
+        async def run(id):
+            try:
+                return BulkResult(id, await fetch(id), None)
+            except Exception as error:
+                return BulkResult(id, None, error)
+
+        window = window or self.max_concurrency * 4
+        in_flight = []
+        for id in _unique(ids):
+            in_flight.append(asyncio.ensure_future(run(id)))
+            if len(in_flight) >= window:
+                if ordered:
+                    yield await in_flight.pop(0)
+                else:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        in_flight.remove(task)
+                        yield task.result()
+        if ordered:
+            for task in in_flight:
+                yield await task
+        else:
+            for task in asyncio.as_completed(in_flight):
+                yield await task
+
+    def get_tickets_by_ids(self, ids, ordered=True, window=None):
+        """
+        :param ids:         iterable    ticket IDs, duplicates are fetched once
+        :param ordered:     bool        (optional) yield in input order, otherwise as completed. Default: True
+        :param window:      int         (optional) max. IDs submitted but not yet yielded. Default: 4 * max_concurrency
+        :return:                        async generator of BulkResult(id, ticket, error)
+        """
+        return self._bulk(self._fetch_ticket, ids, ordered, window)
+
+    def get_ticket_custom_fields_by_ids(self, ids, ordered=True, window=None):
+        """
+        Same as get_tickets_by_ids, for get_ticket_custom_fields_by_id.
+        """
+        return self._bulk(self._fetch_ticket_custom_fields, ids, ordered, window)
@@ -0,0 +1,156 @@
+import logging
+import sys
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("jitbit")
+
+"""
+Unit of work for ticket mutations:
+
+    with BatchWriter(api, max_workers=8) as batch:
+        batch.update_ticket(1001, statusId=3)
+        batch.update_ticket(1001, assignedUserId=7)     # merged with the line above into one UpdateTicket
+        batch.set_custom_field(1001, 12, "yes")
+        batch.update_ticket(1001, statusId=1)           # a separate UpdateTicket after SetCustomField
+        batch.add_subscriber(1002, 55)
+    for result in batch.results:
+        ...
+
+Tickets are written concurrently (under the client's rate limiter), the operations of one ticket run in the
+order they were queued. SetCustomField and AddSubscriber take one value per call, so only update_ticket
+calls are merged, and only with an update_ticket of the same ticket that no other operation separates
+them from. BatchWriter(api, dry_run=True) prints the planned HTTP calls instead of sending them.
+"""
+
+
+class OperationResult(namedtuple("OperationResult", ["index", "ticket_id", "operation", "ok", "value", "error"])):
+    """
+    Outcome of one queued operation. index is its position in the queue, value what the client method
+    returned. Merged update_ticket operations share the result of their common call.
+    """
+    __slots__ = ()
+
+
+class _Call(object):
+    __slots__ = ("operation", "ticket_id", "arguments", "indexes")
+
+    def __init__(self, operation, ticket_id, arguments, index):
+        self.operation = operation
+        self.ticket_id = ticket_id
+        self.arguments = arguments
+        self.indexes = [index]
+
+    def describe(self):
+        if self.operation == "update_ticket":
+            return "POST UpdateTicket %r" % dict(self.arguments, id=self.ticket_id)
+        if self.operation == "set_custom_field":
+            field_id, value = self.arguments
+            return "POST SetCustomField %r" % {"ticketId": self.ticket_id, "fieldId": field_id, "value": value}
+        return "GET AddSubscriber?id=%d&userId=%d" % (self.ticket_id, self.arguments)
+
+
+class BatchWriter(object):
+    def __init__(self, api, max_workers=8, dry_run=False, out=None):
+        """
+        :param api:         JitBitAPI
+        :param max_workers: int     (optional) tickets written in parallel. Default: 8
+        :param dry_run:     bool    (optional) print the planned calls instead of sending them
+        :param out:         file    (optional) where dry runs print to. Default: sys.stdout
+        """
+        self.api = api
+        self.max_workers = max_workers
+        self.dry_run = dry_run
+        self.out = out
+        self.results = []
+        self._queue = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def update_ticket(self, ticket_id, **fields):
+        """
+        Queues an update_ticket call, see JitBitAPI.update_ticket for the fields.
+        """
+        assert ticket_id, "Must provide a ticket id"
+        self._queue.append(("update_ticket", ticket_id, fields))
+
+    def set_custom_field(self, ticket_id, field_id, value):
+        assert all([ticket_id, field_id, value]), "Must provide values for ticketId, fieldId and value"
+        self._queue.append(("set_custom_field", ticket_id, (field_id, value)))
+
+    def add_subscriber(self, ticket_id, user_id):
+        assert all([ticket_id, user_id]), "Must provide values for ticketId and userId"
+        self._queue.append(("add_subscriber", ticket_id, user_id))
+
+    def plan(self):
+        """
+        :return:    OrderedDict     ticket ID -> list of _Call, update_ticket calls merged with the update_ticket
+                                    queued right before them for the same ticket
+        """
+        plan = OrderedDict()
+        for index, (operation, ticket_id, arguments) in enumerate(self._queue):
+            calls = plan.setdefault(ticket_id, [])
+            if operation == "update_ticket":
+                if calls and calls[-1].operation == "update_ticket":
+                    # later values win, like they would when sent one after the other
+                    calls[-1].arguments.update(arguments)
+                    calls[-1].indexes.append(index)
+                    continue
+                arguments = dict(arguments)
+            calls.append(_Call(operation, ticket_id, arguments, index))
+        return plan
+
+    def _send(self, call):
+        if call.operation == "update_ticket":
+            return self.api.update_ticket(call.ticket_id, **call.arguments)
+        if call.operation == "set_custom_field":
+            return self.api.set_custom_field_by_id(call.ticket_id, *call.arguments)
+        return self.api.add_subscriber_by_id(call.ticket_id, call.arguments)
+
+    def _write_ticket(self, calls):
+        results = []
+        for call in calls:
+            try:
+                value = self._send(call)
+                # update_ticket returns a bool, the others the HTTP status code
+                ok = value is True or value == 200
+                error = None
+            except Exception as exception:
+                value, ok, error = None, False, exception
+            if not ok:
+                logger.warning("Batch %s for ticket %s failed: %s", call.operation, call.ticket_id, error or value)
+            results.extend(OperationResult(index, call.ticket_id, call.operation, ok, value, error)
+                           for index in call.indexes)
+        return results
+
+    def flush(self):
+        """
+        Sends everything queued so far and empties the queue.
+
+        :return:    list    one OperationResult per queued operation, in queue order
+        """
+        plan = self.plan()
+        self._queue = []
+        if self.dry_run:
+            out = self.out or sys.stdout
+            results = []
+            for calls in plan.values():
+                for call in calls:
+                    print(call.describe(), file=out)
+                    results.extend(OperationResult(index, call.ticket_id, call.operation, True, None, None)
+                                   for index in call.indexes)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = [result for ticket_results in executor.map(self._write_ticket, plan.values())
+                           for result in ticket_results]
+        results.sort(key=lambda result: result.index)
+        self.results.extend(results)
+        return results
@@ -0,0 +1,349 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("jitbit")
+
+"""
+Response cache for reference data that hardly ever changes (categories, companies, techs, custom field
+definitions, stats, articles):
+
+    cache = ResponseCache(maxsize=1024, backend=SQLiteCacheBackend("/tmp/jitbit-cache.sqlite"))
+    api = JitBitAPI(url, username, password, cache=cache)
+
+Only successful GETs of endpoints with a TTL are cached. The in-process LRU sits in front of the optional
+shared backend, so several worker processes pointing at the same SQLite file share one warm cache.
+
+Records that change at any time (tickets, their custom fields, articles) can't get a TTL. RevalidationCache
+keeps them together with their validators and asks the server whether they changed instead:
+
+    api = JitBitAPI(url, username, password, revalidation=RevalidationCache())
+
+Every read is still a request, but an unchanged record costs a 304 without a body, or (when the server
+sends neither ETag nor Last-Modified) at least no JSON decoding: the body is hashed and the previously
+decoded object returned when the hash matches.
+"""
+
+# seconds a response stays valid, per endpoint (lowercase, as the API treats method names case-insensitive)
+DEFAULT_TTLS = {
+    "categories": 3600,
+    "companies": 3600,
+    "techsforcategory": 600,
+    "customfieldsforcategory": 3600,
+    "stats": 60,
+    "articles": 600,
+}
+
+# endpoints RevalidationCache handles by default
+REVALIDATED = ("ticket", "ticketcustomfields", "article")
+
+# endpoints whose cached responses become stale after a successful (HTTP method, endpoint) call
+INVALIDATED_BY = {
+    ("POST", "createuser"): ["companies", "techsforcategory"],
+    ("POST", "updateuser"): ["companies", "techsforcategory"],
+    ("POST", "ticket"): ["stats"],
+    ("POST", "updateticket"): ["stats"],
+    ("GET", "mergetickets"): ["stats"],
+}
+
+
+def endpoint_of(method):
+    """
+    :param method:  string  API method incl. query string, e.g. "TechsForCategory?id=3"
+    :return:        string  lowercase endpoint name, e.g. "techsforcategory"
+    """
+    return method.split("?", 1)[0].split("/", 1)[0].lower()
+
+
+class CachedResponse(object):
+    """
+    Stands in for a requests.Response on a cache hit.
+    """
+    __slots__ = ("status_code", "content", "headers")
+
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+        self.headers = {}
+
+
+class SQLiteCacheBackend(object):
+    """
+    Shared cache in a local SQLite file, safe to use from several threads and processes.
+    """
+
+    def __init__(self, path, timeout=30):
+        """
+        :param path:    string  database file, created if missing
+        :param timeout: float   (optional) seconds to wait for a lock held by another process. Default: 30
+        """
+        import sqlite3
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS response_cache (namespace TEXT, method TEXT, "
+                                 "endpoint TEXT, content BLOB, expires REAL, PRIMARY KEY (namespace, method))")
+
+    def get(self, namespace, method):
+        with self._lock:
+            row = self._connection.execute("SELECT content, expires FROM response_cache "
+                                           "WHERE namespace = ? AND method = ? AND expires > ?",
+                                           (namespace, method, time.time())).fetchone()
+        return row
+
+    def set(self, namespace, method, content, expires):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)",
+                                     (namespace, method, endpoint_of(method), content, expires))
+
+    def invalidate(self, namespace=None, endpoint=None):
+        query, args = "DELETE FROM response_cache WHERE 1 = 1", []
+        if namespace is not None:
+            query += " AND namespace = ?"
+            args.append(namespace)
+        if endpoint is not None:
+            query += " AND endpoint = ?"
+            args.append(endpoint)
+        with self._lock:
+            self._connection.execute(query, args)
+
+    def close(self):
+        self._connection.close()
+
+
+class _PendingCall(object):
+    __slots__ = ("event", "response", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ResponseCache(object):
+    def __init__(self, maxsize=1024, ttls=None, backend=None):
+        """
+        :param maxsize: int     (optional) max. responses kept in memory. Default: 1024
+        :param ttls:    dict    (optional) endpoint -> seconds, merged over DEFAULT_TTLS. A TTL of 0 or None
+                                disables caching for that endpoint.
+        :param backend:         (optional) shared second level, e.g. SQLiteCacheBackend
+        """
+        self.maxsize = maxsize
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update({endpoint.lower(): ttl for endpoint, ttl in (ttls or {}).items()})
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, method):
+        return self.ttls.get(endpoint_of(method))
+
+    def get(self, namespace, method):
+        """
+        :return:    bytes   cached body, None on a miss
+        """
+        key = (namespace, method)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        if self.backend is not None:
+            row = self.backend.get(namespace, method)
+            if row is not None:
+                self._store(key, row[0], row[1])
+                with self._lock:
+                    self.hits += 1
+                return row[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, namespace, method, content):
+        ttl = self.ttl_for(method)
+        if not ttl:
+            return
+        expires = time.time() + ttl
+        self._store((namespace, method), content, expires)
+        if self.backend is not None:
+            self.backend.set(namespace, method, content, expires)
+
+    def _store(self, key, content, expires):
+        with self._lock:
+            self._entries[key] = (expires, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def fetch(self, namespace, method, send):
+        """
+        Returns the cached response or calls send() for it. Concurrent misses on the same key wait for a
+        single send() instead of each sending their own request.
+
+        :param send:    callable    sends the request, returns a response
+        :return:                    response (CachedResponse on a hit)
+        """
+        content = self.get(namespace, method)
+        if content is not None:
+            return CachedResponse(content)
+        key = (namespace, method)
+        with self._lock:
+            call = self._pending.get(key)
+            leader = call is None
+            if leader:
+                call = self._pending[key] = _PendingCall()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+        try:
+            call.response = send()
+            if call.response.status_code == 200:
+                self.set(namespace, method, call.response.content)
+            return call.response
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            call.event.set()
+
+    def invalidate(self, namespace=None, endpoint=None):
+        """
+        Drops cached responses, all of them by default.
+
+        :param namespace:   string  (optional) only those of one client, see JitBitAPI.cache_namespace
+        :param endpoint:    string  (optional) only those of one endpoint, e.g. "Companies"
+        """
+        endpoint = endpoint.lower() if endpoint else None
+        with self._lock:
+            for key in list(self._entries):
+                if (namespace is None or key[0] == namespace) and (endpoint is None or endpoint_of(key[1]) == endpoint):
+                    del self._entries[key]
+        if self.backend is not None:
+            self.backend.invalidate(namespace, endpoint)
+
+    def invalidate_after(self, namespace, http_method, method):
+        """
+        Drops what a successful call to method made stale, see INVALIDATED_BY.
+
+        :param http_method: string  "GET" or "POST"
+        :param method:      string  API method
+        """
+        for endpoint in INVALIDATED_BY.get((http_method, endpoint_of(method)), ()):
+            logger.debug("%s invalidates cached %s", method, endpoint)
+            self.invalidate(namespace, endpoint)
+
+
+class _Validated(object):
+    __slots__ = ("etag", "last_modified", "digest", "value")
+
+    def __init__(self, response, digest, value):
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.digest = digest
+        self.value = value
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers or None
+
+
+class RevalidationCache(object):
+    """
+    Decoded responses with their validators (ETag, Last-Modified and a hash of the body). The stored objects
+    are handed out again on every hit, treat them as read-only.
+    """
+
+    def __init__(self, maxsize=4096, endpoints=REVALIDATED):
+        """
+        :param maxsize:     int     (optional) max. records kept. Default: 4096
+        :param endpoints:   list    (optional) endpoints to revalidate. Default: Ticket, TicketCustomFields, Article
+        """
+        self.maxsize = maxsize
+        self.endpoints = frozenset(endpoint.lower() for endpoint in endpoints)
+        # revalidations: requests sent for a stored record, not_modified: answered 304,
+        # unchanged: full answer with the same body
+        self.revalidations = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def handles(self, method):
+        return endpoint_of(method) in self.endpoints
+
+    def get(self, namespace, method):
+        key = (namespace, method)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.revalidations += 1
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resolve(self, namespace, method, entry, response, parse):
+        """
+        :param entry:       what get() returned before the request was sent
+        :param response:    answer to the (conditional) request
+        :param parse:       callable    the API method's parser, only called when the body changed
+        """
+        if entry is not None and response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+            return entry.value
+        if response.status_code != 200:
+            return parse(response)
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        if entry is not None and entry.digest == digest:
+            with self._lock:
+                self.unchanged += 1
+            self._store((namespace, method), _Validated(response, digest, entry.value))
+            return entry.value
+        value = parse(response)
+        if value is not None:
+            self._store((namespace, method), _Validated(response, digest, value))
+        return value
+
+    @property
+    def hit_rate(self):
+        """
+        Share of revalidations that reused the stored record, None before the first one.
+        """
+        if not self.revalidations:
+            return None
+        return (self.not_modified + self.unchanged) / self.revalidations
+
+    def stats(self):
+        return {"records": len(self._entries), "revalidations": self.revalidations,
+                "not_modified": self.not_modified, "unchanged": self.unchanged, "hit_rate": self.hit_rate}
+
+    def invalidate(self, namespace=None):
+        with self._lock:
+            for key in list(self._entries):
+                if namespace is None or key[0] == namespace:
+                    del self._entries[key]
@@ -0,0 +1,356 @@
+import csv
+import json
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from jitbit import JitBitAPI, write_json_atomic
+from jitbit_models import parse_date
+
+logger = logging.getLogger("jitbit")
+
+"""
+Full export of tickets (with their custom fields), users, companies and assets, fetched by several worker
+processes and streamed to partitioned files:
+
+    job = ExportJob(url, username, password, "export/2024-05", format="parquet", date_from="2015-01-01")
+    job.run()
+
+    python -m jitbit_export https://helpdesk.example.com admin export/ --format csv --date-from 2015-01-01
+
+Tickets are split into shards of shard_days by creation date, every shard becomes one file, e.g.
+export/tickets/part-2015-01-01.ndjson; users, companies and assets are one shard each. Files are written
+under a temporary name and renamed when the shard is complete. Finished shards are recorded in
+_export_state.json in the output directory, so running the same job again only redoes the failed ones.
+
+The custom fields of each ticket are joined in as "CustomFields". CSV and Parquet files get one column per
+field of the first record; nested values are stored as JSON text, fields the first record didn't have go
+into an "extra" column. Parquet column types come from the first 5000 records, columns that are empty
+throughout them are stored as text. Parquet needs pyarrow.
+"""
+
+DATASETS = ("tickets", "users", "companies", "assets")
+STATE_FILE = "_export_state.json"
+
+
+class Shard(namedtuple("Shard", ["name", "dataset", "date_from", "date_to"])):
+    """
+    One unit of work. Ticket shards cover creation dates from date_from (inclusive) to date_to (exclusive),
+    None for both means all tickets.
+    """
+    __slots__ = ()
+
+
+def plan_shards(datasets=DATASETS, date_from=None, date_to=None, shard_days=30):
+    """
+    :param date_from:   string  (optional) ISO date of the oldest ticket. Default: one shard for all tickets
+    :param date_to:     string  (optional) ISO date after the newest ticket. Default: tomorrow
+    :param shard_days:  int     (optional) days of tickets per shard. Default: 30
+    :return:            list    of Shard
+    """
+    shards = []
+    if "tickets" in datasets:
+        if date_from is None:
+            shards.append(Shard("all", "tickets", None, None))
+        else:
+            start = date.fromisoformat(date_from)
+            end = date.fromisoformat(date_to) if date_to else date.today() + timedelta(days=1)
+            while start < end:
+                stop = min(start + timedelta(days=shard_days), end)
+                shards.append(Shard(start.isoformat(), "tickets", start.isoformat(), stop.isoformat()))
+                start = stop
+    shards.extend(Shard("all", dataset, None, None) for dataset in datasets if dataset != "tickets")
+    return shards
+
+
+def _flatten(record, columns):
+    row = {}
+    for column in columns:
+        value = record.get(column)
+        row[column] = json.dumps(value) if isinstance(value, (list, dict)) else value
+    extra = {key: value for key, value in record.items() if key not in row}
+    row["extra"] = json.dumps(extra) if extra else None
+    return row
+
+
+class _NDJSONWriter(object):
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")))
+        self._file.write("\n")
+
+    def close(self):
+        self._file.close()
+
+
+class _CSVWriter(object):
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = None
+        self._columns = None
+
+    def write(self, record):
+        if self._writer is None:
+            self._columns = list(record)
+            self._writer = csv.DictWriter(self._file, self._columns + ["extra"])
+            self._writer.writeheader()
+        self._writer.writerow(_flatten(record, self._columns))
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter(object):
+    batch_size = 5000
+
+    def __init__(self, path):
+        import pyarrow
+
+        self._pyarrow = pyarrow
+        self._path = path
+        self._writer = None
+        self._schema = None
+        self._columns = None
+        self._text_columns = []
+        self._batch = []
+
+    def write(self, record):
+        if self._columns is None:
+            self._columns = list(record)
+        self._batch.append(_flatten(record, self._columns))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow.parquet
+
+        if not self._batch:
+            return
+        for row in self._batch:
+            for column in self._text_columns:
+                if row[column] is not None and not isinstance(row[column], str):
+                    row[column] = json.dumps(row[column])
+        table = self._pyarrow.Table.from_pylist(self._batch, schema=self._schema)
+        if self._writer is None:
+            # a column that is None throughout the first batch is typed null, which no later value fits:
+            # it is written as strings, later values that aren't strings as JSON
+            types = self._pyarrow.types
+            self._text_columns = [field.name for field in table.schema if types.is_null(field.type)]
+            self._schema = self._pyarrow.schema([field.with_type(self._pyarrow.string()) if types.is_null(field.type)
+                                                 else field for field in table.schema])
+            table = table.cast(self._schema)
+            self._writer = pyarrow.parquet.ParquetWriter(self._path, self._schema)
+        self._writer.write_table(table)
+        self._batch = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+        else:
+            # no records, still leave a file behind so the shard counts as written
+            open(self._path, "wb").close()
+
+
+WRITERS = {"ndjson": _NDJSONWriter, "csv": _CSVWriter, "parquet": _ParquetWriter}
+
+# one client per worker process and connection, reused for all shards the process gets
+_clients = {}
+
+
+def _client(connection):
+    api = _clients.get(connection)
+    if api is None:
+        api_url, username, password, options = connection
+        api = _clients[connection] = JitBitAPI(api_url, username, password, **dict(options))
+    return api
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _tickets(api, shard, custom_fields, threads):
+    filters = {"mode": "all", "statusId": ""}
+    if shard.date_from:
+        # the API's dateTo may or may not be inclusive, ask for one day more and cut by IssueDate
+        filters["datefrom"] = shard.date_from
+        filters["dateto"] = shard.date_to
+    tickets = api.iter_tickets(prefetch=True, **filters)
+    if shard.date_from:
+        tickets = (t for t in tickets if shard.date_from <= _issue_day(t) < shard.date_to)
+    for chunk in _chunks(tickets, 100):
+        if custom_fields:
+            fields = {result.id: result for result in
+                      api.get_ticket_custom_fields_by_ids([t["IssueID"] for t in chunk], max_workers=threads)}
+            for ticket in chunk:
+                result = fields[ticket["IssueID"]]
+                if not result.ok:
+                    raise result.error
+                ticket["CustomFields"] = result.value
+        yield from chunk
+
+
+def _issue_day(ticket):
+    issued = parse_date(ticket.get("IssueDate"))
+    return issued.date().isoformat() if issued else ""
+
+
+def _records(api, shard, custom_fields, threads):
+    if shard.dataset == "tickets":
+        return _tickets(api, shard, custom_fields, threads)
+    if shard.dataset == "users":
+        return api.iter_users(prefetch=True)
+    if shard.dataset == "companies":
+        return api.get_companies()
+    return api.iter_assets(prefetch=True)
+
+
+def shard_path(out_dir, shard, format):
+    return os.path.join(out_dir, shard.dataset, "part-%s.%s" % (shard.name, format))
+
+
+def export_shard(connection, shard, out_dir, format="ndjson", custom_fields=True, threads=8):
+    """
+    Writes one shard. Runs in the worker processes, but can be called directly to redo a single shard.
+
+    :param connection:  tuple   (api_url, username, password, options), options a tuple of
+                                (name, value) pairs passed on to JitBitAPI
+    :return:            int     records written
+    """
+    api = _client(connection)
+    path = shard_path(out_dir, shard, format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    writer = WRITERS[format](temp_path)
+    written = 0
+    try:
+        for record in _records(api, shard, custom_fields, threads):
+            writer.write(record)
+            written += 1
+    finally:
+        writer.close()
+    os.replace(temp_path, path)
+    return written
+
+
+class ExportJob(object):
+    def __init__(self, api_url, username, password, out_dir, format="ndjson", datasets=DATASETS, date_from=None,
+                 date_to=None, shard_days=30, processes=4, threads=8, custom_fields=True, **options):
+        """
+        :param out_dir:         string  output directory, one subdirectory per dataset
+        :param format:          string  (optional) "ndjson", "csv" or "parquet". Default: "ndjson"
+        :param datasets:        list    (optional) any of tickets, users, companies, assets. Default: all
+        :param date_from:       string  (optional) ISO date, see plan_shards
+        :param date_to:         string  (optional) ISO date, see plan_shards
+        :param shard_days:      int     (optional) days of tickets per shard. Default: 30
+        :param processes:       int     (optional) worker processes. Default: 4
+        :param threads:         int     (optional) parallel custom field requests per process. Default: 8
+        :param custom_fields:   bool    (optional) join each ticket's custom fields. Default: True
+        :param options:                 (optional) passed on to JitBitAPI in the workers, e.g. read_timeout
+        """
+        assert format in WRITERS, "format must be one of %s" % list(WRITERS)
+        if format == "parquet":
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                raise ImportError("Parquet export needs pyarrow, install it or pick ndjson or csv")
+        self.connection = (api_url, username, password, tuple(sorted(options.items())))
+        self.out_dir = out_dir
+        self.format = format
+        self.shards = plan_shards(datasets, date_from, date_to, shard_days)
+        self.processes = processes
+        self.threads = threads
+        self.custom_fields = custom_fields
+        self.state_path = os.path.join(out_dir, STATE_FILE)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = None
+        if not state or state.get("format") != self.format:
+            return {"format": self.format, "done": {}, "failed": {}}
+        return state
+
+    def _save_state(self):
+        write_json_atomic(self.state_path, self.state, indent=1)
+
+    @staticmethod
+    def _key(shard):
+        return "%s/%s" % (shard.dataset, shard.name)
+
+    def pending(self):
+        """
+        :return:    list    shards not finished by a previous run
+        """
+        return [shard for shard in self.shards if self._key(shard) not in self.state["done"]]
+
+    def run(self):
+        """
+        Exports every pending shard. A failing shard doesn't stop the others; it is logged, kept in the state
+        file's "failed" section and tried again by the next run.
+
+        :return:    dict    {"done": {shard: records}, "failed": {shard: error}} of this job so far
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        pending = self.pending()
+        logger.info("Export of %d shards to %s, %d done before", len(pending), self.out_dir,
+                    len(self.shards) - len(pending))
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            futures = {executor.submit(export_shard, self.connection, shard, self.out_dir, self.format,
+                                       self.custom_fields, self.threads): shard for shard in pending}
+            for future in as_completed(futures):
+                key = self._key(futures[future])
+                try:
+                    self.state["done"][key] = future.result()
+                    self.state["failed"].pop(key, None)
+                except Exception as error:
+                    logger.error("Export of %s failed: %r", key, error)
+                    self.state["failed"][key] = repr(error)
+                self._save_state()
+        return {"done": dict(self.state["done"]), "failed": dict(self.state["failed"])}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a JitBit helpdesk to NDJSON, CSV or Parquet files")
+    parser.add_argument("api_url")
+    parser.add_argument("username")
+    parser.add_argument("out_dir")
+    parser.add_argument("--password", default=os.environ.get("JITBIT_PASSWORD"),
+                        help="default: the JITBIT_PASSWORD environment variable")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="ndjson")
+    parser.add_argument("--datasets", nargs="*", default=list(DATASETS))
+    parser.add_argument("--date-from", help="ISO date of the oldest ticket, enables sharding by date")
+    parser.add_argument("--date-to")
+    parser.add_argument("--shard-days", type=int, default=30)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--no-custom-fields", action="store_true")
+    args = parser.parse_args()
+    if not args.password:
+        parser.error("pass --password or set JITBIT_PASSWORD")
+    unknown = set(args.datasets) - set(DATASETS)
+    if unknown:
+        parser.error("unknown datasets: %s" % ", ".join(sorted(unknown)))
+    logging.basicConfig(level=logging.INFO)
+    result = ExportJob(args.api_url, args.username, args.password, args.out_dir, args.format, args.datasets,
+                       args.date_from, args.date_to, args.shard_days, args.processes, args.threads,
+                       not args.no_custom_fields).run()
+    print("%d shards done, %d failed" % (len(result["done"]), len(result["failed"])))
+    raise SystemExit(1 if result["failed"] else 0)
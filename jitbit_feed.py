@@ -0,0 +1,325 @@
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+logger = logging.getLogger("jitbit")
+
+"""
+One poller for many consumers. ChangeFeed polls get_tickets (and get_stats) on an adaptive interval, diffs
+what it gets against its last snapshot and hands typed events to every subscriber:
+
+    feed = ChangeFeed(api, categoryId=4)
+    feed.subscribe(on_event, types=[STATUS_CHANGED, ASSIGNED])
+    feed.serve("/run/jitbit-feed.sock")                 # other processes: for event in listen("/run/...")
+    feed.start()
+
+Each poll asks for the tickets updated since the day of the newest change seen, so unchanged tickets of that
+day come back and are dropped by the diff. The API has no event log, so the event types are inferred:
+an unknown ticket issued inside the poll's window (on or after its updatedFrom day) is created; a changed
+StatusID is a status change, a changed AssignedToUserID an assignment; a newer LastUpdated with neither is
+reported as commented (JitBit bumps it for replies, but also for edits of other fields). Unknown older
+tickets are reported as updated. The first poll only takes the snapshot.
+
+The snapshot only keeps the tickets the next poll can return: a ticket last updated before that poll's
+window is dropped, so a long-running feed holds about a day of tickets. When such a ticket changes later,
+it is unknown again and reported as updated.
+
+The interval halves (down to min_interval) after a poll with events and grows by half (up to max_interval)
+after a quiet one.
+"""
+
+TICKET_CREATED = "ticket.created"
+STATUS_CHANGED = "ticket.status_changed"
+ASSIGNED = "ticket.assigned"
+COMMENTED = "ticket.commented"
+TICKET_UPDATED = "ticket.updated"
+STATS_CHANGED = "stats.changed"
+
+EVENT_TYPES = (TICKET_CREATED, STATUS_CHANGED, ASSIGNED, COMMENTED, TICKET_UPDATED, STATS_CHANGED)
+
+
+class Event(namedtuple("Event", ["type", "ticket_id", "data", "previous", "time"])):
+    """
+    data is the ticket (or the stats for stats.changed), previous the snapshot values it was compared to:
+    {"StatusID", "AssignedToUserID", "LastUpdated"}, None for created and updated events.
+    """
+    __slots__ = ()
+
+    def to_json(self):
+        return json.dumps(self._asdict(), separators=(",", ":"), default=str)
+
+    @classmethod
+    def from_json(cls, line):
+        return cls(**json.loads(line))
+
+
+class ChangeFeed(object):
+    id_field = "IssueID"
+    tracked_fields = ("StatusID", "AssignedToUserID", "LastUpdated")
+
+    def __init__(self, api, interval=30, min_interval=5, max_interval=300, lookback_days=1, stats=True, **filters):
+        """
+        :param api:             JitBitAPI
+        :param interval:        float   (optional) seconds between the first polls. Default: 30
+        :param min_interval:    float   (optional) fastest polling while busy. Default: 5
+        :param max_interval:    float   (optional) slowest polling while idle. Default: 300
+        :param lookback_days:   int     (optional) days of changes the first snapshot covers. Default: 1
+        :param stats:           bool    (optional) also poll get_stats and emit stats.changed. Default: True
+        :param filters:                 (optional) additional get_tickets filters, e.g. categoryId
+        """
+        assert 0 < min_interval <= interval <= max_interval, "Need 0 < min_interval <= interval <= max_interval"
+        self.api = api
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lookback_days = lookback_days
+        self.poll_stats = stats
+        self.filters = filters
+        self.snapshot = None
+        self.stats = None
+        self.newest = None
+        self.updated_from = None
+        self.polls = 0
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._publishers = []
+
+    def subscribe(self, callback, types=None):
+        """
+        :param callback:    callable    called with every Event, from the polling thread. Slow consumers
+                                        should hand events off, e.g. to a queue.Queue's put.
+        :param types:       list        (optional) event types to receive. Default: all
+        :return:            the subscription, pass it to unsubscribe
+        """
+        subscription = (callback, frozenset(types) if types else None)
+        with self._lock:
+            # copy on write, publish() iterates without the lock
+            self.subscribers = self.subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscription]
+
+    def publish(self, event):
+        for callback, types in self.subscribers:
+            if types is not None and event.type not in types:
+                continue
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Change feed subscriber %r failed for %s", callback, event.type)
+
+    def _window_start(self):
+        """
+        :return:    string  the updatedFrom date of the next poll
+        """
+        if self.newest:
+            return self.newest[:10]
+        return (date.today() - timedelta(days=self.lookback_days)).isoformat()
+
+    def _fetch(self):
+        self.updated_from = self._window_start()
+        filters = dict(self.filters, mode="all", statusId="", updatedfrom=self.updated_from)
+        return self.api.iter_tickets(**filters)
+
+    def _prune(self):
+        # tickets last updated before the next window can't come back unchanged, there is nothing to diff them with
+        updated_from = self._window_start()
+        position = self.tracked_fields.index("LastUpdated")
+        stale = [ticket_id for ticket_id, values in self.snapshot.items()
+                 if (values[position] or "")[:10] < updated_from]
+        for ticket_id in stale:
+            del self.snapshot[ticket_id]
+
+    def _diff(self, ticket, now):
+        ticket_id = ticket[self.id_field]
+        values = tuple(ticket.get(field) for field in self.tracked_fields)
+        previous = self.snapshot.get(ticket_id)
+        if previous == values:
+            return []
+        self.snapshot[ticket_id] = values
+        if previous is None:
+            issued = (ticket.get("IssueDate") or "")[:10]
+            kind = TICKET_CREATED if issued >= self.updated_from else TICKET_UPDATED
+            return [Event(kind, ticket_id, ticket, None, now)]
+        status_id, assigned, last_updated = values
+        old = dict(zip(self.tracked_fields, previous))
+        events = []
+        if status_id != old["StatusID"]:
+            events.append(Event(STATUS_CHANGED, ticket_id, ticket, old, now))
+        if assigned != old["AssignedToUserID"]:
+            events.append(Event(ASSIGNED, ticket_id, ticket, old, now))
+        if not events and last_updated != old["LastUpdated"]:
+            events.append(Event(COMMENTED, ticket_id, ticket, old, now))
+        return events
+
+    def poll(self):
+        """
+        Polls once and publishes what changed.
+
+        :return:    list    the events of this poll
+        """
+        now = time.time()
+        events = []
+        tickets = self._fetch()
+        if self.snapshot is None:
+            self.snapshot = {}
+            for ticket in tickets:
+                self.snapshot[ticket[self.id_field]] = tuple(ticket.get(field) for field in self.tracked_fields)
+                self._see(ticket)
+            logger.info("Change feed snapshot of %d tickets", len(self.snapshot))
+        else:
+            for ticket in tickets:
+                events.extend(self._diff(ticket, now))
+                self._see(ticket)
+        self._prune()
+        if self.poll_stats:
+            stats = self.api.get_stats()
+            if self.stats is not None and stats != self.stats:
+                events.append(Event(STATS_CHANGED, None, stats, self.stats, now))
+            self.stats = stats
+        self.polls += 1
+        for event in events:
+            self.publish(event)
+        self._adapt(events)
+        return events
+
+    def _see(self, ticket):
+        updated = ticket.get("LastUpdated")
+        if updated and (self.newest is None or updated > self.newest):
+            self.newest = updated
+
+    def _adapt(self, events):
+        if events:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    def run(self):
+        """
+        Polls until stop() is called. Failed polls are logged and retried after the current interval.
+        """
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Change feed poll failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """
+        Runs the feed in a daemon thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="jitbit-change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for publisher in self._publishers:
+            publisher.close()
+        self._publishers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def serve(self, address, types=None):
+        """
+        Publishes the events as JSON lines to every client connected to a local socket.
+
+        :param address:     string  path of a Unix socket, or (host, port) for TCP
+        :param types:       list    (optional) event types to send. Default: all
+        :return:            SocketPublisher
+        """
+        publisher = SocketPublisher(address)
+        publisher.subscription = self.subscribe(publisher, types)
+        self._publishers.append(publisher)
+        return publisher
+
+
+class SocketPublisher(object):
+    """
+    Subscriber writing events to the clients of a listening socket, one JSON object per line. A client that
+    can't keep up for send_timeout seconds is disconnected.
+    """
+    send_timeout = 5
+
+    def __init__(self, address):
+        if isinstance(address, str):
+            # a socket left behind by an earlier run, anything else at that path stays and bind() fails
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen()
+        self.address = self._server.getsockname()
+        self.clients = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._accept, name="jitbit-feed-socket", daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            client.settimeout(self.send_timeout)
+            with self._lock:
+                self.clients.append(client)
+
+    def __call__(self, event):
+        line = (event.to_json() + "\n").encode()
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.sendall(line)
+            except OSError:
+                logger.info("Change feed client disconnected")
+                with self._lock:
+                    self.clients.remove(client)
+                client.close()
+
+    def close(self):
+        self._server.close()
+        with self._lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def listen(address):
+    """
+    Client side of ChangeFeed.serve().
+
+    :param address:     string  path of the Unix socket, or (host, port)
+    :return:            generator of Event, ends when the feed closes the connection
+    """
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        with connection.makefile("r", encoding="utf-8") as lines:
+            for line in lines:
+                yield Event.from_json(line)
@@ -0,0 +1,234 @@
+import bisect
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+
+"""
+Per-request metrics. Register any callable with api.add_hook(), it is called with a RequestRecord after
+every API call. MetricsCollector is such a hook and keeps latency histograms per endpoint:
+
+    metrics = MetricsCollector()
+    api.add_hook(metrics)
+    ...
+    print(metrics.summary())
+    open("jitbit.prom", "w").write(metrics.prometheus())
+
+Without hooks the clients skip all of this, so it costs nothing.
+"""
+
+# the record of the API call running in this thread / asyncio task, None when nobody is listening
+current_record = ContextVar("jitbit_current_record", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class RequestRecord(object):
+    """
+    One API call, retries included. Times are in seconds and summed over all attempts, ttfb is the wait for the
+    response headers after the connection was established.
+    """
+    __slots__ = ("endpoint", "http_method", "status", "latency", "connect", "ttfb", "download", "response_bytes",
+                 "retries", "cache", "error", "_started")
+
+    def __init__(self, method, http_method):
+        self.endpoint = method.split("?", 1)[0].split("/", 1)[0]
+        self.http_method = http_method
+        self.status = None
+        self.latency = 0.0
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.download = 0.0
+        self.response_bytes = 0
+        self.retries = 0
+        # "hit", "miss" or None for endpoints that aren't cached
+        self.cache = None
+        self.error = None
+        self._started = perf_counter()
+
+    def finish(self):
+        self.latency = perf_counter() - self._started
+
+    def __repr__(self):
+        return "<RequestRecord %s %s %s %.3fs>" % (self.http_method, self.endpoint, self.status, self.latency)
+
+
+def _timed_connect(connect):
+    def timed(self):
+        record = current_record.get()
+        if record is None:
+            return connect(self)
+        started = perf_counter()
+        try:
+            return connect(self)
+        finally:
+            record.connect += perf_counter() - started
+    return timed
+
+
+# pool classes with timed connects, built by install_connect_timing() so importing this module stays cheap
+_timed_pool_classes = None
+
+
+def _build_timed_pool_classes():
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _TimedHTTPConnection(HTTPConnection):
+        connect = _timed_connect(HTTPConnection.connect)
+
+    class _TimedHTTPSConnection(HTTPSConnection):
+        connect = _timed_connect(HTTPSConnection.connect)
+
+    class _TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _TimedHTTPConnection
+
+    class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _TimedHTTPSConnection
+
+    return {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+def install_connect_timing(adapter):
+    """
+    Makes the pools of a requests HTTPAdapter add their connect times to the current RequestRecord.
+    """
+    global _timed_pool_classes
+    if _timed_pool_classes is None:
+        _timed_pool_classes = _build_timed_pool_classes()
+    adapter.poolmanager.pool_classes_by_scheme = dict(_timed_pool_classes)
+
+
+class _EndpointStats(object):
+    __slots__ = ("count", "errors", "statuses", "buckets", "latency_sum", "connect_sum", "ttfb_sum", "download_sum",
+                 "response_bytes", "retries", "cache_hits", "cache_misses")
+
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.buckets = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+        self.connect_sum = 0.0
+        self.ttfb_sum = 0.0
+        self.download_sum = 0.0
+        self.response_bytes = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class MetricsCollector(object):
+    """
+    In-memory latency histograms and counters per (endpoint, HTTP method). Thread-safe.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: tuple   (optional) upper bounds of the latency buckets in seconds
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        key = (record.endpoint, record.http_method)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _EndpointStats(len(self.buckets))
+            stats.count += 1
+            if record.error is not None or record.status is None or record.status >= 400:
+                stats.errors += 1
+            status = record.status if record.status is not None else "error"
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.buckets[bisect.bisect_left(self.buckets, record.latency)] += 1
+            stats.latency_sum += record.latency
+            stats.connect_sum += record.connect
+            stats.ttfb_sum += record.ttfb
+            stats.download_sum += record.download
+            stats.response_bytes += record.response_bytes
+            stats.retries += record.retries
+            if record.cache == "hit":
+                stats.cache_hits += 1
+            elif record.cache == "miss":
+                stats.cache_misses += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def _quantile(self, stats, q):
+        # upper bound of the bucket the quantile falls into, like Prometheus' histogram_quantile
+        rank = q * stats.count
+        seen = 0
+        for bound, count in zip(self.buckets, stats.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        """
+        :return:    dict    "endpoint METHOD" -> counters, mean times and p50/p95/p99 latency
+        """
+        with self._lock:
+            result = {}
+            for (endpoint, http_method), stats in sorted(self._stats.items()):
+                result["%s %s" % (endpoint, http_method)] = {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "statuses": dict(stats.statuses),
+                    "mean": stats.latency_sum / stats.count,
+                    "mean_connect": stats.connect_sum / stats.count,
+                    "mean_ttfb": stats.ttfb_sum / stats.count,
+                    "mean_download": stats.download_sum / stats.count,
+                    "p50": self._quantile(stats, 0.5),
+                    "p95": self._quantile(stats, 0.95),
+                    "p99": self._quantile(stats, 0.99),
+                    "response_bytes": stats.response_bytes,
+                    "retries": stats.retries,
+                    "cache_hits": stats.cache_hits,
+                    "cache_misses": stats.cache_misses,
+                }
+            return result
+
+    def prometheus(self, prefix="jitbit"):
+        """
+        :return:    string  all metrics in the Prometheus text exposition format
+        """
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append("# HELP %s_%s %s" % (prefix, name, help))
+            lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_text = ",".join('%s="%s"' % item for item in labels)
+                lines.append("%s_%s%s{%s} %s" % (prefix, name, suffix, label_text, value))
+
+        with self._lock:
+            items = sorted(self._stats.items())
+            latency, requests, phases, counters = [], [], [], {"response_bytes": [], "retries": [], "cache_hits": [],
+                                                               "cache_misses": []}
+            for (endpoint, http_method), stats in items:
+                labels = (("endpoint", endpoint), ("method", http_method))
+                cumulative = 0
+                for bound, count in zip(self.buckets, stats.buckets):
+                    cumulative += count
+                    latency.append(("_bucket", labels + (("le", repr(bound)),), cumulative))
+                latency.append(("_bucket", labels + (("le", "+Inf"),), stats.count))
+                latency.append(("_sum", labels, stats.latency_sum))
+                latency.append(("_count", labels, stats.count))
+                for status, count in sorted(stats.statuses.items(), key=str):
+                    requests.append(("", labels + (("status", status),), count))
+                for phase in ("connect", "ttfb", "download"):
+                    phases.append(("", labels + (("phase", phase),), getattr(stats, phase + "_sum")))
+                for name in counters:
+                    counters[name].append(("", labels, getattr(stats, name)))
+        metric("request_duration_seconds", "histogram", "API call latency incl. retries", latency)
+        metric("requests_total", "counter", "API calls by status", requests)
+        metric("request_phase_seconds_total", "counter", "Time spent per request phase", phases)
+        metric("response_bytes_total", "counter", "Response body bytes", counters["response_bytes"])
+        metric("retries_total", "counter", "Retried attempts", counters["retries"])
+        metric("cache_hits_total", "counter", "Responses served from the cache", counters["cache_hits"])
+        metric("cache_misses_total", "counter", "Cacheable calls sent to the server", counters["cache_misses"])
+        return "\n".join(lines) + "\n"
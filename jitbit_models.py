@@ -0,0 +1,424 @@
+import json
+import re
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+
+"""
+Compact, opt-in alternatives to the plain dicts the API methods return:
+
+    tickets = [Ticket.from_json(t) for t in api.get_tickets(count=100)]
+    for ticket in api.iter_tickets(model=Ticket):
+        print(ticket.issue_id, ticket.status, ticket.last_updated.year)
+
+    frame = Frame.from_records(api.iter_tickets(), Ticket)     # one array per field
+    frame.column("status_id")
+
+Models use __slots__ instead of a dict per record, intern low-cardinality strings (status, category,
+company names, ...) and parse dates on first access. Nested fields (tags, attachments, ...) are kept as
+compact JSON (bytes) and only decoded when touched; one that arrives as a plain string, e.g. "a,b" for
+tags, isn't JSON and is used as it is (Ticket.tag_names gives the names for either form). Keys a model
+doesn't know are kept in extra, to_dict() gives back the API's field names.
+"""
+
+# field kinds
+PLAIN = 0
+INTERN = 1
+DATE = 2
+NESTED = 3
+
+_ASPNET_DATE = re.compile(r"/Date\((-?\d+)")
+
+
+def parse_date(value):
+    """
+    :param value:   string  "2016-11-24T10:00:00(.fff)(Z)" or the ASP.NET style "/Date(1480000000000)/"
+    :return:        datetime, None for an empty value
+    """
+    if not value:
+        return None
+    match = _ASPNET_DATE.match(value)
+    if match:
+        return datetime.fromtimestamp(int(match.group(1)) / 1000.0, tz=timezone.utc)
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _tag_names(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(sys.intern(tag["Name"]) if isinstance(tag, dict) else tag.strip() for tag in value or ())
+
+
+# shared by every record with an empty nested field
+_EMPTY_JSON = {list: b"[]", dict: b"{}"}
+
+
+def _encode_nested(value):
+    # bytes, so lists and dicts encoded here can be told from a plain string the API sent
+    if value.__class__ in _EMPTY_JSON:
+        if not value:
+            return _EMPTY_JSON[value.__class__]
+        return json.dumps(value, separators=(",", ":")).encode()
+    return value
+
+
+def _lazy_property(slot, convert):
+    def get(self):
+        value = getattr(self, slot)
+        if value.__class__ is bytes:
+            value = convert(json.loads(value))
+        elif value.__class__ is str:
+            value = convert(value)
+        else:
+            return value
+        setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+
+class _ModelMeta(type):
+    """
+    Turns the fields declaration of a model into __slots__, lazy properties and the lookup tables
+    from_json() uses.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        fields = namespace.get("fields", ())
+        slots = []
+        layout = []
+        for field in fields:
+            attribute, key, kind = field[:3]
+            if kind in (DATE, NESTED):
+                slot = "_" + attribute
+                convert = field[3] if len(field) > 3 else (parse_date if kind == DATE else _freeze)
+                namespace[attribute] = _lazy_property(slot, convert)
+            else:
+                slot = attribute
+            slots.append(slot)
+            layout.append((sys.intern(slot), sys.intern(key), kind))
+        namespace["__slots__"] = tuple(namespace.get("__slots__", ())) + tuple(slots)
+        namespace["_layout"] = tuple(layout)
+        namespace["_attributes"] = tuple((slot.lstrip("_"), key) for slot, key, _ in layout)
+        namespace["_keys"] = frozenset(key for _, key, _ in layout)
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class Model(metaclass=_ModelMeta):
+    __slots__ = ("extra",)
+    fields = ()
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        :param data:    dict    one record as returned by the API
+        """
+        record = cls.__new__(cls)
+        get = data.get
+        for slot, key, kind in cls._layout:
+            value = get(key)
+            if kind == INTERN and value.__class__ is str:
+                value = sys.intern(value)
+            elif kind == NESTED:
+                value = _encode_nested(value)
+            object.__setattr__(record, slot, value)
+        keys = cls._keys
+        record.extra = None if keys.issuperset(data) else {key: value for key, value in data.items() if key not in keys}
+        return record
+
+    @classmethod
+    def from_list(cls, records):
+        return [cls.from_json(data) for data in records]
+
+    def to_dict(self):
+        result = {}
+        for attribute, key in self._attributes:
+            value = getattr(self, attribute)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, tuple):
+                value = list(value)
+            result[key] = value
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        slot, key, _ = self._layout[0]
+        return "<%s %s=%r>" % (type(self).__name__, key, getattr(self, slot))
+
+
+class Ticket(Model):
+    fields = (
+        ("issue_id", "IssueID", PLAIN),
+        ("subject", "Subject", PLAIN),
+        ("body", "Body", PLAIN),
+        ("priority", "Priority", PLAIN),
+        ("priority_name", "PriorityName", INTERN),
+        ("status_id", "StatusID", PLAIN),
+        ("status", "Status", INTERN),
+        ("category_id", "CategoryID", PLAIN),
+        ("category", "Category", INTERN),
+        ("section_id", "SectionID", PLAIN),
+        ("issue_date", "IssueDate", DATE),
+        ("last_updated", "LastUpdated", DATE),
+        ("due_date", "DueDate", DATE),
+        ("user_id", "UserID", PLAIN),
+        ("user_name", "UserName", INTERN),
+        ("first_name", "FirstName", INTERN),
+        ("last_name", "LastName", INTERN),
+        ("email", "Email", INTERN),
+        ("company_id", "CompanyID", PLAIN),
+        ("company_name", "CompanyName", INTERN),
+        ("assigned_to_user_id", "AssignedToUserID", PLAIN),
+        ("technician", "Technician", INTERN),
+        ("tech_first_name", "TechFirstName", INTERN),
+        ("tech_last_name", "TechLastName", INTERN),
+        ("updated_by_user", "UpdatedByUser", PLAIN),
+        ("updated_by_performer", "UpdatedByPerformer", PLAIN),
+        ("tags", "Tags", NESTED),
+        ("attachments", "Attachments", NESTED),
+        ("custom_fields", "CustomFields", NESTED),
+    )
+
+    @property
+    def tag_names(self):
+        """
+        :return:    tuple   the tag names, whether Tags came as a list of {"TagID", "Name"} or as "a,b"
+        """
+        return _tag_names(self.tags)
+
+
+class User(Model):
+    fields = (
+        ("user_id", "UserID", PLAIN),
+        ("username", "Username", PLAIN),
+        ("email", "Email", PLAIN),
+        ("first_name", "FirstName", INTERN),
+        ("last_name", "LastName", INTERN),
+        ("notes", "Notes", PLAIN),
+        ("location", "Location", INTERN),
+        ("phone", "Phone", PLAIN),
+        ("company_id", "CompanyID", PLAIN),
+        ("company_name", "CompanyName", INTERN),
+        ("department_id", "DepartmentID", PLAIN),
+        ("department_name", "DepartmentName", INTERN),
+        ("is_admin", "IsAdmin", PLAIN),
+        ("is_tech", "IsTech", PLAIN),
+        ("disabled", "Disabled", PLAIN),
+        ("send_email", "SendEmail", PLAIN),
+        ("last_seen", "LastSeen", DATE),
+    )
+
+
+class Asset(Model):
+    fields = (
+        ("item_id", "ItemID", PLAIN),
+        ("model_name", "ModelName", INTERN),
+        ("manufacturer", "Manufacturer", INTERN),
+        ("type", "Type", INTERN),
+        ("supplier", "Supplier", INTERN),
+        ("serial_number", "SerialNumber", PLAIN),
+        ("location", "Location", INTERN),
+        ("comments", "Comments", PLAIN),
+        ("quantity", "Quantity", PLAIN),
+        ("users", "Users", NESTED),
+        ("companies", "Companies", NESTED),
+        ("departments", "Departments", NESTED),
+    )
+
+
+class Company(Model):
+    fields = (
+        ("company_id", "CompanyID", PLAIN),
+        ("name", "Name", PLAIN),
+        ("notes", "Notes", PLAIN),
+        ("email_domain", "EmailDomain", PLAIN),
+    )
+
+
+class Category(Model):
+    fields = (
+        ("category_id", "CategoryID", PLAIN),
+        ("name", "Name", PLAIN),
+        ("name_with_section", "NameWithSection", PLAIN),
+        ("section_id", "SectionID", PLAIN),
+        ("section", "Section", INTERN),
+        ("for_techs_only", "ForTechsOnly", PLAIN),
+        ("for_selected_users", "ForSelectedUsers", PLAIN),
+    )
+
+
+def _int_array(values):
+    """
+    :return:    array("q") or array("b") of a column of ints or bools (None as 0), None for other columns
+    """
+    present = [value for value in values if value is not None]
+    if not present:
+        return None
+    if all(value.__class__ is bool for value in present):
+        typecode = "b"
+    elif all(value.__class__ is int for value in present):
+        typecode = "q"
+    else:
+        return None
+    try:
+        return array(typecode, [0 if value is None else value for value in values])
+    except OverflowError:
+        return None
+
+
+def _date_array(values):
+    """
+    :return:    (array("q") of microseconds since 1970, aware) for a column of dates, None when a value
+                doesn't parse or the column mixes time zones, which the array can't keep
+    """
+    micros = array("q")
+    aware = None
+    for value in values:
+        if not value:
+            micros.append(0)
+            continue
+        try:
+            parsed = parse_date(value)
+        except (TypeError, ValueError):
+            return None
+        offset = parsed.utcoffset()
+        if offset or (aware is not None and aware != (offset is not None)):
+            return None
+        aware = offset is not None
+        micros.append((parsed.replace(tzinfo=None) - _EPOCH) // _MICROSECOND)
+    if aware is None:
+        return None
+    return micros, aware
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class Frame(object):
+    """
+    Columnar view of a list result: one array per field instead of one object per record. Integer columns
+    become array("q") (8 bytes per value), boolean ones array("b"), dates array("q") of microseconds since
+    1970. Columns with missing values get a null mask next to the array, see null_mask. Text and nested
+    fields stay lists. frame[i] builds the model of one row on demand.
+    """
+
+    def __init__(self, model, columns, length, extra=None, nulls=None, dates=None):
+        """
+        :param nulls:   dict    slot -> bytearray, 1 for the rows whose value is missing
+        :param dates:   dict    slot -> bool, whether the dates of an array column are UTC (else naive)
+        """
+        self.model = model
+        self.columns = columns
+        self.length = length
+        self.extra = extra
+        self.nulls = nulls or {}
+        self.dates = dates or {}
+
+    @classmethod
+    def from_records(cls, records, model):
+        """
+        :param records: iterable    records as returned by the API, e.g. api.iter_tickets()
+        :param model:   class       Model subclass describing the fields, e.g. Ticket
+        """
+        layout = model._layout
+        columns = {slot: [] for slot, _, _ in layout}
+        appends = [(columns[slot].append, key, kind) for slot, key, kind in layout]
+        extra = None
+        length = 0
+        for data in records:
+            get = data.get
+            for append, key, kind in appends:
+                value = get(key)
+                if kind == INTERN and value.__class__ is str:
+                    value = sys.intern(value)
+                elif kind == NESTED:
+                    value = _encode_nested(value)
+                append(value)
+            if not model._keys.issuperset(data):
+                if extra is None:
+                    extra = {}
+                extra[length] = {key: value for key, value in data.items() if key not in model._keys}
+            length += 1
+        nulls, dates = {}, {}
+        for slot, _, kind in layout:
+            values = columns[slot]
+            if kind == DATE:
+                converted = _date_array(values)
+                if converted is None:
+                    continue
+                columns[slot], dates[slot] = converted
+                missing = [not value for value in values]
+            elif kind == PLAIN:
+                converted = _int_array(values)
+                if converted is None:
+                    continue
+                columns[slot] = converted
+                missing = [value is None for value in values]
+            else:
+                continue
+            if any(missing):
+                nulls[slot] = bytearray(missing)
+        return cls(model, columns, length, extra, nulls, dates)
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        """
+        :param name:    string  attribute name, e.g. "status_id" or "last_updated". Raw values: dates as
+                                microseconds since 1970 (or unparsed strings when the column couldn't be
+                                converted), nested fields as JSON bytes, booleans as 0 / 1, missing values
+                                of an array column as 0, see null_mask
+        """
+        if name in self.columns:
+            return self.columns[name]
+        return self.columns["_" + name]
+
+    def null_mask(self, name):
+        """
+        :return:    bytearray   1 for every row whose value is missing, None if the column has none
+        """
+        return self.nulls.get(name, self.nulls.get("_" + name))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        record = self.model.__new__(self.model)
+        nulls = self.nulls
+        for slot, values in self.columns.items():
+            value = values[index]
+            if values.__class__ is array:
+                if slot in nulls and nulls[slot][index]:
+                    value = None
+                elif slot in self.dates:
+                    value = _EPOCH + value * _MICROSECOND
+                    if self.dates[slot]:
+                        value = value.replace(tzinfo=timezone.utc)
+                elif values.typecode == "b":
+                    value = bool(value)
+            object.__setattr__(record, slot, value)
+        record.extra = self.extra.get(index) if self.extra else None
+        return record
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
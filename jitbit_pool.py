@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from jitbit import _AUTH_FAILED_STATUSES, BulkResult, JitBitAPI, JitBitAPIError, _parse_status_code
+from jitbit_metrics import install_connect_timing
+from jitbit_throttle import QuotaLimiter, TokenBucket
+
+logger = logging.getLogger("jitbit")
+
+"""
+Clients for many JitBit instances that share one set of resources:
+
+    pool = JitBitClientPool(rate=50, cache=ResponseCache(), idle_timeout=600)
+    pool.add("acme", "https://acme.jitbit.com/helpdesk", "api", "secret", rate=5)
+    pool.add("globex", "https://support.globex.com", "api", "secret")
+    pool.check_credentials()                                # optional, all tenants in parallel
+    pool.client("acme").get_tickets(mode="unclosed")
+    stats = pool.fan_out(lambda api: api.get_stats())     # {"acme": BulkResult, "globex": BulkResult}
+
+Registering a tenant costs nothing; its JitBitAPI is created on first use, without the blocking
+test_credentials() call of a plain JitBitAPI. Credentials are checked on that first use unless
+check_credentials() did it already. All clients use one connection pool (HTTPAdapter), one ResponseCache
+(entries are namespaced per instance and credentials) and one TokenBucket capping the total request rate;
+each tenant can have its own rate on top. A 429 only slows down the tenant that got it, never the shared
+cap. Clients unused for idle_timeout seconds are dropped and recreated on demand.
+"""
+
+
+class _Tenant(object):
+    __slots__ = ("name", "api_url", "username", "password", "limiter", "options", "client", "checked",
+                 "last_used", "lock")
+
+    def __init__(self, name, api_url, username, password, limiter, options):
+        self.name = name
+        self.api_url = api_url
+        self.username = username
+        self.password = password
+        self.limiter = limiter
+        self.options = options
+        self.client = None
+        self.checked = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class JitBitClientPool(object):
+    def __init__(self, rate=None, burst=None, cache=None, idle_timeout=600, pool_connections=50, pool_maxsize=10,
+                 max_workers=16, **options):
+        """
+        :param rate:                float           (optional) requests per second for all tenants together
+        :param burst:               int             (optional) burst of the shared rate. Default: rate
+        :param cache:               ResponseCache   (optional) shared by all tenants, see jitbit_cache
+        :param idle_timeout:        float           (optional) seconds before an unused client is dropped, None
+                                                    keeps them. Default: 600
+        :param pool_connections:    int             (optional) hosts to keep connection pools for. Default: 50
+        :param pool_maxsize:        int             (optional) keep-alive connections per host. Default: 10
+        :param max_workers:         int             (optional) tenants queried in parallel by fan_out. Default: 16
+        :param options:                             (optional) passed on to every JitBitAPI, e.g. read_timeout
+        """
+        self.limiter = TokenBucket(rate, burst) if rate else None
+        self.cache = cache
+        self.idle_timeout = idle_timeout
+        self.max_workers = max_workers
+        self.options = options
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        install_connect_timing(self.adapter)
+        self.tenants = OrderedDict()
+        self._by_credentials = {}
+        # reentrant, get() registers new tenants through add() while holding it
+        self._lock = threading.RLock()
+
+    def add(self, name, api_url, username, password, rate=None, burst=None, **options):
+        """
+        Registers a tenant, nothing is sent yet.
+
+        :param name:        string  name to address the tenant by
+        :param rate:        float   (optional) this tenant's own requests per second
+        :param burst:       int     (optional) burst of the tenant's rate. Default: rate
+        :param options:             (optional) JitBitAPI arguments for this tenant only
+        """
+        own = TokenBucket(rate, burst) if rate else None
+        # the shared bucket is always wrapped, so one tenant's 429 doesn't penalize it for every tenant
+        limiter = own if self.limiter is None else QuotaLimiter(own, self.limiter)
+        with self._lock:
+            assert name not in self.tenants, "Tenant %s is already registered" % name
+            tenant = self.tenants[name] = _Tenant(name, api_url, username, password, limiter, options)
+            self._by_credentials[(api_url, username, password)] = tenant
+        return tenant
+
+    def remove(self, name):
+        with self._lock:
+            tenant = self.tenants.pop(name)
+            del self._by_credentials[(tenant.api_url, tenant.username, tenant.password)]
+        if self.cache is not None and tenant.client is not None:
+            self.cache.invalidate(tenant.client.cache_namespace)
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def __contains__(self, name):
+        return name in self.tenants
+
+    def _create(self, tenant):
+        options = dict(self.options, **tenant.options)
+        options.setdefault("cache", self.cache)
+        options.setdefault("rate_limiter", tenant.limiter)
+        # the shared adapter must outlive the client, so pooled clients are never close()d
+        return JitBitAPI(tenant.api_url, tenant.username, tenant.password, adapter=self.adapter,
+                         check_credentials=False, **options)
+
+    def _checked_client(self, tenant):
+        with tenant.lock:
+            if tenant.client is None:
+                tenant.client = self._create(tenant)
+            if not tenant.checked:
+                # unlike test_credentials(), tells rejected credentials from an unreachable or failing server
+                status = tenant.client._call("Authorization", _parse_status_code)
+                if status in _AUTH_FAILED_STATUSES:
+                    logger.error("Authorization failed for JitBit tenant %s", tenant.name)
+                    raise ValueError("Authorization failed for tenant %s, please check the credentials" % tenant.name)
+                if status != 200:
+                    raise JitBitAPIError("Authorization", status, b"")
+                tenant.checked = True
+            tenant.last_used = time.monotonic()
+            return tenant.client
+
+    def client(self, name):
+        """
+        :return:    JitBitAPI   the tenant's client, created (and its credentials checked) on first use
+        """
+        self.evict_idle()
+        return self._checked_client(self.tenants[name])
+
+    def get(self, api_url, username, password):
+        """
+        Client by instance URL and credentials, the tenant is registered under its URL if it is new.
+        """
+        with self._lock:
+            tenant = self._by_credentials.get((api_url, username, password))
+            if tenant is None:
+                name = api_url if api_url not in self.tenants else "%s|%s" % (api_url, username)
+                tenant = self.add(name, api_url, username, password)
+        return self.client(tenant.name)
+
+    def check_credentials(self, names=None):
+        """
+        Creates the clients and checks the credentials of all (or the named) tenants in parallel.
+
+        :return:    dict    name -> True, False for rejected credentials, or the exception of a tenant that
+                            couldn't be checked (network error, 5xx)
+        """
+        checked = OrderedDict()
+        for name, result in self.fan_out(lambda api: True, names).items():
+            if result.ok:
+                checked[name] = True
+            elif isinstance(result.error, ValueError):
+                checked[name] = False
+            else:
+                checked[name] = result.error
+        return checked
+
+    def evict_idle(self):
+        """
+        Drops the clients unused for idle_timeout seconds. The tenants stay registered.
+
+        :return:    int     clients dropped
+        """
+        if self.idle_timeout is None:
+            return 0
+        limit = time.monotonic() - self.idle_timeout
+        evicted = 0
+        for tenant in list(self.tenants.values()):
+            if tenant.client is not None and tenant.last_used < limit and tenant.lock.acquire(blocking=False):
+                try:
+                    tenant.client = None
+                    evicted += 1
+                finally:
+                    tenant.lock.release()
+        if evicted:
+            logger.info("Dropped %d idle JitBit clients", evicted)
+        return evicted
+
+    def _call(self, tenant, call):
+        return call(self._checked_client(tenant))
+
+    def fan_out(self, call, names=None):
+        """
+        Runs call(api) for every (or every named) tenant in parallel.
+
+        :param call:    callable    takes a JitBitAPI, e.g. lambda api: api.get_tickets(mode="unclosed")
+        :param names:   list        (optional) tenants to query. Default: all
+        :return:        OrderedDict name -> BulkResult(name, value, error), in registration order
+        """
+        self.evict_idle()
+        tenants = [self.tenants[name] for name in names] if names is not None else list(self.tenants.values())
+        results = OrderedDict()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tenants)))) as executor:
+            futures = [(tenant.name, executor.submit(self._call, tenant, call)) for tenant in tenants]
+            for name, future in futures:
+                error = future.exception()
+                if error is not None:
+                    logger.warning("JitBit tenant %s failed: %r", name, error)
+                results[name] = BulkResult(name, None if error else future.result(), error)
+        return results
+
+    def fan_out_records(self, call, names=None, tenant_field="Tenant"):
+        """
+        fan_out for calls returning lists: the records of all tenants merged into one list, each a copy
+        tagged with the tenant's name. The records the calls returned (possibly shared with a cache) stay
+        untouched.
+
+        :return:    (list of records, dict name -> error of the tenants that failed)
+        """
+        records, errors = [], {}
+        for name, result in self.fan_out(call, names).items():
+            if not result.ok:
+                errors[name] = result.error
+                continue
+            for record in result.value or ():
+                record = dict(record)
+                record[tenant_field] = name
+                records.append(record)
+        return records, errors
+
+    def close(self):
+        """
+        Closes the shared connection pool, the pool can't be used afterwards.
+        """
+        with self._lock:
+            for tenant in self.tenants.values():
+                tenant.client = None
+        self.adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,204 @@
+import json
+import logging
+import sqlite3
+import threading
+
+from jitbit_sync import TicketSync
+
+logger = logging.getLogger("jitbit")
+
+"""
+Local SQLite copy of tickets, users and companies for dashboard-style lookups that would otherwise need several
+get_tickets calls and client-side joins:
+
+    store = TicketStore("jitbit.sqlite")
+    store.load(api)                                     # once, full copy
+    store.refresh(api, "jitbit-sync.json")              # then only what changed, see TicketSync
+    store.find_tickets(company_id=12, assigned_to=7, tag="vip", status_id=[1, 2])
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY, status_id INTEGER, category_id INTEGER, company_id INTEGER, assigned_to INTEGER,
+    user_id INTEGER, updated TEXT, data TEXT);
+CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status_id);
+CREATE INDEX IF NOT EXISTS tickets_category ON tickets (category_id);
+CREATE INDEX IF NOT EXISTS tickets_company ON tickets (company_id, status_id);
+CREATE INDEX IF NOT EXISTS tickets_assigned ON tickets (assigned_to, status_id);
+CREATE INDEX IF NOT EXISTS tickets_updated ON tickets (updated);
+CREATE TABLE IF NOT EXISTS ticket_tags (ticket_id INTEGER, tag TEXT COLLATE NOCASE, PRIMARY KEY (ticket_id, tag));
+CREATE INDEX IF NOT EXISTS ticket_tags_tag ON ticket_tags (tag);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY, username TEXT COLLATE NOCASE, email TEXT COLLATE NOCASE, company_id INTEGER, data TEXT);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE INDEX IF NOT EXISTS users_company ON users (company_id);
+CREATE TABLE IF NOT EXISTS companies (id INTEGER PRIMARY KEY, name TEXT COLLATE NOCASE, data TEXT);
+CREATE INDEX IF NOT EXISTS companies_name ON companies (name);
+"""
+
+
+def _tags_of(ticket):
+    tags = ticket.get("Tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return {(tag.get("Name", "") if isinstance(tag, dict) else tag).strip() for tag in tags} - {""}
+
+
+class TicketStore(object):
+    batch_size = 500
+
+    def __init__(self, path):
+        """
+        :param path:    string  database file, created if missing. ":memory:" keeps it in RAM.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write_batches(self, records, write):
+        batch = []
+        written = 0
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                written += self._write_batch(batch, write)
+                batch = []
+        if batch:
+            written += self._write_batch(batch, write)
+        return written
+
+    def _write_batch(self, batch, write):
+        with self._lock, self._connection:
+            write(batch)
+        return len(batch)
+
+    def _upsert_tickets(self, tickets):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(t["IssueID"], t.get("StatusID"), t.get("CategoryID"), t.get("CompanyID"), t.get("AssignedToUserID"),
+              t.get("UserID"), t.get("LastUpdated"), json.dumps(t)) for t in tickets])
+        self._connection.executemany("DELETE FROM ticket_tags WHERE ticket_id = ?", [(t["IssueID"],) for t in tickets])
+        self._connection.executemany("INSERT OR IGNORE INTO ticket_tags VALUES (?, ?)",
+                                     [(t["IssueID"], tag) for t in tickets for tag in _tags_of(t)])
+
+    def _upsert_users(self, users):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)",
+            [(u["UserID"], u.get("Username"), u.get("Email"), u.get("CompanyID") or u.get("CompanyId"), json.dumps(u))
+             for u in users])
+
+    def _upsert_companies(self, companies):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO companies VALUES (?, ?, ?)",
+            [(c.get("CompanyID") or c.get("CompanyId") or c.get("ID"), c.get("Name"), json.dumps(c)) for c in companies])
+
+    def add_tickets(self, tickets):
+        """
+        :param tickets: iterable    ticket dicts as returned by get_tickets, replacing stored ones with the same ID
+        :return:        int         number of tickets written
+        """
+        return self._write_batches(tickets, self._upsert_tickets)
+
+    def add_users(self, users):
+        return self._write_batches(users, self._upsert_users)
+
+    def add_companies(self, companies):
+        return self._write_batches(companies, self._upsert_companies)
+
+    def load(self, api, prefetch=True):
+        """
+        Copies all tickets, users and companies from the API.
+
+        :param api:         JitBitAPI
+        :param prefetch:    bool    (optional) fetch the next page while the current one is written. Default: True
+        """
+        companies = self.add_companies(api.get_companies())
+        users = self.add_users(api.iter_users(prefetch=prefetch))
+        tickets = self.add_tickets(api.iter_tickets(mode="all", statusId="", prefetch=prefetch))
+        logger.info("Ticket store loaded %d tickets, %d users, %d companies", tickets, users, companies)
+
+    def refresh(self, api, state_path, **kwargs):
+        """
+        Pulls the tickets changed since the last refresh, see TicketSync for the arguments. Every page is
+        committed before the sync saves its progress, so an interrupted refresh resumes without gaps.
+
+        :return:    int     number of tickets written
+        """
+        return sum(self.add_tickets(page) for page in TicketSync(api, state_path, **kwargs).pages())
+
+    def _query(self, query, args):
+        with self._lock:
+            return [json.loads(row[0]) for row in self._connection.execute(query, args)]
+
+    def find_tickets(self, status_id=None, category_id=None, company_id=None, assigned_to=None, user_id=None,
+                     tag=None, updated_from=None, updated_to=None, limit=None):
+        """
+        All filters are optional and combined with AND. Status, category, company, assignee and user also
+        take a list of IDs.
+
+        :param tag:             string  tag name, case-insensitive
+        :param updated_from:    string  ISO date(time), inclusive
+        :param updated_to:      string  ISO date(time), exclusive
+        :param limit:           int     max. tickets to return
+        :return:                list    ticket dicts, most recently updated first
+        """
+        where, args = [], []
+        for column, value in (("status_id", status_id), ("category_id", category_id), ("company_id", company_id),
+                              ("assigned_to", assigned_to), ("user_id", user_id)):
+            if value is None:
+                continue
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            where.append("%s IN (%s)" % (column, ", ".join("?" * len(values))))
+            args.extend(values)
+        if tag is not None:
+            where.append("id IN (SELECT ticket_id FROM ticket_tags WHERE tag = ?)")
+            args.append(tag)
+        if updated_from is not None:
+            where.append("updated >= ?")
+            args.append(updated_from)
+        if updated_to is not None:
+            where.append("updated < ?")
+            args.append(updated_to)
+        query = "SELECT data FROM tickets"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY updated DESC"
+        if limit is not None:
+            query += " LIMIT %d" % limit
+        return self._query(query, args)
+
+    def get_ticket(self, ticket_id):
+        tickets = self._query("SELECT data FROM tickets WHERE id = ?", (ticket_id,))
+        return tickets[0] if tickets else None
+
+    def find_users(self, company_id=None, email=None, username=None):
+        where, args = [], []
+        for column, value in (("company_id", company_id), ("email", email), ("username", username)):
+            if value is not None:
+                where.append("%s = ?" % column)
+                args.append(value)
+        query = "SELECT data FROM users"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return self._query(query, args)
+
+    def get_user_by_email(self, email):
+        users = self.find_users(email=email)
+        return users[0] if users else None
+
+    def find_companies(self, name=None):
+        if name is None:
+            return self._query("SELECT data FROM companies", ())
+        return self._query("SELECT data FROM companies WHERE name = ?", (name,))
@@ -0,0 +1,124 @@
+import json
+import re
+
+"""
+JSON decoding for the clients. loads() uses the fastest decoder installed (orjson, then ujson, then the
+standard library), set_decoder() swaps it. JSONArraySplitter cuts a JSON array into its elements while the
+body is still arriving, so list endpoints can yield records before the download is done and never hold more
+than one element plus one chunk of raw bytes:
+
+    splitter = JSONArraySplitter()
+    for chunk in response.iter_content(65536):
+        for record in splitter.feed(chunk):
+            ...
+    splitter.close()
+"""
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+
+        _loads = ujson.loads
+    except ImportError:
+        _loads = json.loads
+
+
+def loads(data):
+    """
+    :param data:    bytes or string with one JSON document
+    """
+    return _loads(data)
+
+
+def set_decoder(decoder):
+    """
+    :param decoder: callable    takes bytes, returns the decoded value, e.g. orjson.loads. None restores
+                                the standard library decoder.
+    """
+    global _loads
+    _loads = decoder or json.loads
+
+
+def decoder_name():
+    return "%s.%s" % (_loads.__module__, _loads.__name__)
+
+
+class JSONArraySplitter(object):
+    """
+    Incremental splitter for a top-level JSON array. It only tracks nesting depth and string state; every
+    element is decoded by loads() as soon as its closing delimiter arrived.
+    """
+
+    _tokens = re.compile(rb'[\[\]{}",\\]')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.depth = 0
+        self.in_string = False
+        self.escape_at = -2
+        # offset of the element being collected in buffer, None before the opening "["
+        self.element_start = None
+        self.done = False
+
+    def _emit(self, end, elements):
+        element = bytes(self.buffer[self.element_start:end]).strip()
+        if element:
+            elements.append(loads(element))
+
+    def feed(self, chunk):
+        """
+        :param chunk:   bytes   next piece of the body
+        :return:        list    elements completed by this chunk
+        """
+        elements = []
+        if self.done or not chunk:
+            return elements
+        if self.element_start is None and not self.buffer:
+            stripped = chunk.lstrip()
+            if not stripped:
+                return elements
+            if stripped[:1] != b"[":
+                raise ValueError("Expected a JSON array, got %r" % stripped[:50])
+        base = len(self.buffer)
+        self.buffer += chunk
+        for match in self._tokens.finditer(chunk):
+            position = base + match.start()
+            token = chunk[match.start()]
+            if self.in_string:
+                if position == self.escape_at + 1:
+                    continue
+                if token == 0x5c:  # backslash
+                    self.escape_at = position
+                elif token == 0x22:  # quote
+                    self.in_string = False
+                continue
+            if token == 0x22:
+                self.in_string = True
+            elif token in (0x7b, 0x5b):  # { [
+                self.depth += 1
+                if self.depth == 1:
+                    self.element_start = position + 1
+            elif token in (0x7d, 0x5d):  # } ]
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit(position, elements)
+                    self.done = True
+                    self.buffer = bytearray()
+                    return elements
+            elif token == 0x2c and self.depth == 1:  # ,
+                self._emit(position, elements)
+                self.element_start = position + 1
+        # drop what has been handed out already, only the element in progress stays in memory
+        if self.element_start:
+            del self.buffer[:self.element_start]
+            self.escape_at -= self.element_start
+            self.element_start = 0
+        return elements
+
+    def close(self):
+        if not self.done and (self.buffer.strip() or self.element_start is not None):
+            raise ValueError("JSON array ended prematurely")
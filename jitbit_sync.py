@@ -0,0 +1,139 @@
+import json
+import logging
+from datetime import date, timedelta
+
+from jitbit import write_json_atomic
+
+logger = logging.getLogger("jitbit")
+
+"""
+Incremental ticket sync. Each run only pulls tickets updated since the previous run:
+
+    sync = TicketSync(api, "jitbit-sync.json")
+    sync.run(mirror.upsert)
+    for page in sync.pages():                           # sinks that write in batches
+        mirror.upsert_many(page)
+
+The updatedFrom filter only takes dates, so every run starts overlap_days before the saved high-water mark
+and drops tickets that weren't updated since. Delivery is at-least-once: a ticket of the page being
+processed when a run crashed can reach the sink twice. The progress is saved when the consumer asks for the
+next ticket (or page), so whatever it was handed must be stored by then.
+"""
+
+
+# get_tickets filters the sync sets itself, lowercase
+_RESERVED_FILTERS = ("mode", "statusid", "updatedfrom")
+
+
+class TicketSync(object):
+    id_field = "IssueID"
+    updated_field = "LastUpdated"
+
+    def __init__(self, api, state_path, overlap_days=1, count=100, **filters):
+        """
+        :param api:             JitBitAPI
+        :param state_path:      string  JSON file keeping the high-water mark and the progress of a running sync
+        :param overlap_days:    int     (optional) days each window reaches back before the high-water mark. Default: 1
+        :param count:           int     (optional) tickets per request. Default: 100
+        :param filters:                 (optional) additional get_tickets filters, e.g. categoryId. mode, statusId
+                                        and updatedFrom are set by the sync: it has to see every changed ticket
+        """
+        reserved = [key for key in filters if key.lower() in _RESERVED_FILTERS]
+        assert not reserved, "TicketSync sets mode, statusId and updatedFrom itself, got %s" % reserved
+        self.api = api
+        self.state_path = state_path
+        self.overlap_days = overlap_days
+        self.count = count
+        self.filters = filters
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"watermark": None, "boundary_ids": [], "run": None}
+
+    def _save_state(self):
+        write_json_atomic(self.state_path, self.state)
+
+    @property
+    def watermark(self):
+        """
+        LastUpdated of the newest ticket seen by the last completed run, None before the first run.
+        """
+        return self.state["watermark"]
+
+    def _start_run(self):
+        watermark = self.state["watermark"]
+        updated_from = ""
+        if watermark:
+            updated_from = (date.fromisoformat(watermark[:10]) - timedelta(days=self.overlap_days)).isoformat()
+        return {"updated_from": updated_from, "offset": 1, "max_seen": watermark,
+                "boundary_ids": list(self.state["boundary_ids"])}
+
+    def changes(self):
+        """
+        Yields every ticket changed since the last run, each ID once. The high-water mark only moves when
+        the generator is exhausted; an interrupted run resumes at its last page. A consumer that buffers
+        tickets before storing them has to use pages() instead.
+        """
+        for page in self.pages():
+            yield from page
+
+    def pages(self):
+        """
+        Same as changes(), but yields the changed tickets of each API page as one list. The offset of the next
+        page (and finally the high-water mark) is saved when the consumer asks for it, i.e. after it stored
+        the previous list.
+        """
+        run = self.state["run"]
+        if run:
+            logger.info("Resuming ticket sync from %s at offset %s", run["updated_from"], run["offset"])
+        else:
+            run = self.state["run"] = self._start_run()
+        watermark = self.state["watermark"]
+        # tickets already synced with LastUpdated == watermark, they show up again in the overlap
+        synced_at_watermark = set(self.state["boundary_ids"])
+        seen = set()
+        filters = dict(self.filters, mode="all", statusId="")
+        if run["updated_from"]:
+            filters["updatedfrom"] = run["updated_from"]
+        tickets = self.api.iter_tickets(offset=run["offset"], count=self.count, **filters)
+        page = []
+        for ticket in tickets:
+            if tickets.position != run["offset"]:
+                # the previous page is complete, the progress is only saved once the consumer is done with it
+                if page:
+                    yield page
+                    page = []
+                run["offset"] = tickets.position
+                self._save_state()
+            ticket_id = ticket[self.id_field]
+            updated = ticket.get(self.updated_field) or ""
+            if ticket_id in seen or (watermark and updated and (
+                    updated < watermark or (updated == watermark and ticket_id in synced_at_watermark))):
+                continue
+            seen.add(ticket_id)
+            if updated and (run["max_seen"] is None or updated > run["max_seen"]):
+                run["max_seen"] = updated
+                run["boundary_ids"] = []
+            if updated and updated == run["max_seen"]:
+                run["boundary_ids"].append(ticket_id)
+            page.append(ticket)
+        if page:
+            yield page
+        self.state = {"watermark": run["max_seen"], "boundary_ids": run["boundary_ids"], "run": None}
+        self._save_state()
+        logger.info("Ticket sync done, %d changed tickets, high-water mark %s", len(seen), self.state["watermark"])
+
+    def run(self, sink):
+        """
+        :param sink:    callable    called with every changed ticket
+        :return:        int         number of tickets handed to the sink
+        """
+        synced = 0
+        for ticket in self.changes():
+            sink(ticket)
+            synced += 1
+        return synced
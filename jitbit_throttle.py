@@ -0,0 +1,204 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger("jitbit")
+
+"""
+Throttling and retries shared by JitBitAPI and AsyncJitBitAPI:
+
+    limiter = TokenBucket(rate=20, burst=40)    # share one instance between clients, threads and event loops
+    api = JitBitAPI(url, username, password, rate_limiter=limiter,
+                    retry=RetryPolicy(max_retries=5), circuit_breaker=CircuitBreaker())
+
+Only reads are retried. Writes, i.e. POSTs (create_ticket, CreateUser, ...) and the GETs MergeTickets and
+AddSubscriber, are resent only inside api.retrying_writes(), see BaseJitBitAPI.retrying_writes.
+"""
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker considers the server unhealthy.
+    """
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Adaptive: a 429 halves the rate (down to min_rate), every success wins a
+    bit of it back, up to the configured rate.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, recovery=0.02):
+        """
+        :param rate:        float   requests per second
+        :param burst:       int     (optional) requests allowed back to back. Default: rate
+        :param min_rate:    float   (optional) floor for the adaptive rate. Default: rate / 20
+        :param recovery:    float   (optional) share of rate won back per success. Default: 0.02
+        """
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.min_rate = float(min_rate or rate / 20.0)
+        self.recovery = recovery
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Takes a token, going into debt if there is none.
+
+        :return:    float   seconds to wait before the request may be sent
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        import asyncio
+
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+        logger.warning("Throttled by JitBit, request rate lowered to %.2f/s", self.rate)
+
+    def reward(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+
+class QuotaLimiter(object):
+    """
+    Combines a client's own quota with a limiter shared by many clients: a request needs a token from both.
+    Throttling answers only adapt the own bucket, they come from that client's server. Without an own quota
+    they change nothing, the shared cap is never lowered by a single client.
+    """
+
+    def __init__(self, own, shared):
+        """
+        :param own:     TokenBucket     the client's quota, None for no quota of its own
+        :param shared:  TokenBucket     cap for all clients together
+        """
+        self.own = own
+        self.shared = shared
+
+    def acquire(self):
+        if self.own is not None:
+            self.own.acquire()
+        self.shared.acquire()
+
+    async def acquire_async(self):
+        if self.own is not None:
+            await self.own.acquire_async()
+        await self.shared.acquire_async()
+
+    def penalize(self):
+        if self.own is not None:
+            self.own.penalize()
+
+    def reward(self):
+        if self.own is not None:
+            self.own.reward()
+
+
+class RetryPolicy(object):
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30, retry_statuses=(429, 500, 502, 503, 504)):
+        """
+        :param max_retries:     int     (optional) retries after the first attempt. Default: 3
+        :param backoff_factor:  float   (optional) first backoff in seconds, doubled per retry. Default: 0.5
+        :param max_backoff:     float   (optional) cap for backoff and Retry-After. Default: 30
+        :param retry_statuses:  tuple   (optional) HTTP status codes worth a retry
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :param attempt:     int     0 for the first retry
+        :param retry_after: string  (optional) Retry-After header of the failed response
+        :return:            float   seconds to wait, full jitter unless the server said how long
+        """
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                from email.utils import parsedate_to_datetime
+
+                try:
+                    seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    seconds = None
+            if seconds is not None:
+                return min(self.max_backoff, max(0.0, seconds))
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """
+    Opens after failure_threshold failures in a row (5xx, 429, connection errors) and fails fast with
+    CircuitOpenError for reset_timeout seconds. Then one trial request is let through, its outcome closes
+    the circuit again or keeps it open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """
+        :return:    the trial token if this request is the trial, None otherwise. Pass it to end_trial()
+                    once the request is over, in case no outcome was recorded.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return None
+            if time.monotonic() - self.opened_at >= self.reset_timeout and self._trial is None:
+                self._trial = object()
+                return self._trial
+        raise CircuitOpenError("JitBit API circuit is open after %d failures" % self.failures)
+
+    def end_trial(self, trial):
+        """
+        Lets the next request try when the trial ended without record_success / record_failure, e.g. on an
+        exception raised before its answer was judged. Does nothing once the outcome was recorded.
+        """
+        with self._lock:
+            if self._trial is trial:
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error("JitBit API circuit opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+                self._trial = None
@@ -0,0 +1,86 @@
+import io
+import os
+import re
+
+"""
+Helpers for the attachment transfers of JitBitAPI (download_attachment, attach_file). Neither side ever holds
+a whole file: downloads are written chunk by chunk to "<path>.part" and renamed when complete, uploads are
+read from the file handle while the request body is sent.
+"""
+
+# bytes read / written per step of an attachment transfer
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+_CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)")
+
+
+def content_range(response):
+    """
+    :return:    (start, total) of a 206 answer, total None when the server doesn't know it, (None, total) of
+                a 416 answer ("bytes */total"), (None, None) without a usable Content-Range header
+    """
+    match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return None if start is None else int(start), None if total == "*" else int(total)
+
+
+class MultipartBody(object):
+    """
+    multipart/form-data request body that reads the file only while it is sent. It has a length, so requests
+    sends a Content-Length header instead of falling back to chunked encoding.
+    """
+
+    def __init__(self, fields, file, filename, progress=None, chunk_size=TRANSFER_CHUNK_SIZE):
+        """
+        :param fields:      dict        plain form fields sent before the file
+        :param file:        file        opened in binary mode, read from its current position
+        :param filename:    string      name the file gets on the ticket
+        :param progress:    callable    (optional) called as progress(bytes_sent, total_bytes)
+        """
+        boundary = os.urandom(16).hex()
+        self.content_type = "multipart/form-data; boundary=%s" % boundary
+        head = io.BytesIO()
+        for name, value in fields.items():
+            head.write(('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                        % (boundary, name, value)).encode())
+        head.write(('--%s\r\nContent-Disposition: form-data; name="file"; filename="%s"\r\n'
+                    'Content-Type: application/octet-stream\r\n\r\n' % (boundary, filename.replace('"', ""))).encode())
+        tail = ("\r\n--%s--\r\n" % boundary).encode()
+        position = file.tell()
+        try:
+            self.file_size = os.fstat(file.fileno()).st_size - position
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # in-memory files have no descriptor
+            self.file_size = file.seek(0, io.SEEK_END) - position
+            file.seek(position)
+        self.length = head.tell() + self.file_size + len(tail)
+        head.seek(0)
+        self._parts = [head, file, io.BytesIO(tail)]
+        self._progress = progress
+        self._chunk_size = chunk_size
+        self.sent = 0
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._chunk_size
+        while self._parts:
+            data = self._parts[0].read(size)
+            if data:
+                self.sent += len(data)
+                if self._progress is not None:
+                    self._progress(self.sent, self.length)
+                return data
+            self._parts.pop(0)
+        return b""
+
+    def __iter__(self):
+        while True:
+            data = self.read(self._chunk_size)
+            if not data:
+                return
+            yield data
@@ -0,0 +1,301 @@
+import csv
+import json
+import logging
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from jitbit import write_json_atomic
+
+logger = logging.getLogger("jitbit")
+
+"""
+Bulk user import with upsert semantics:
+
+    provisioning = UserProvisioning(api, checkpoint_path="import-acme.json", max_workers=8)
+    for outcome in provisioning.run(read_users_csv("acme-users.csv")):
+        print(outcome.row, outcome.action, outcome.user_id, outcome.error)
+
+Existing users are resolved once against a snapshot of get_users, indexed by email and username, instead of
+a get_user_by_email call per row. Rows of known users become update_user_by_id calls (skipped when nothing
+changed); the others become create_user calls. The password column only goes to new users unless
+reset_passwords=True. Rows sharing an email or username run one after the other, everything else in parallel.
+Finished rows are written to the checkpoint file, so an interrupted import can be started again with the same
+input and only does the rest; a row whose email differs from the one recorded for its position runs again.
+
+Row keys are the create_user / update_user_by_id argument names: username, password, email, first_name,
+last_name, company, department, phone, location, notes, disabled, send_welcome_email.
+"""
+
+# row key -> field of the Users records
+_USER_FIELDS = OrderedDict([
+    ("username", "Username"),
+    ("email", "Email"),
+    ("first_name", "FirstName"),
+    ("last_name", "LastName"),
+    ("company", "CompanyName"),
+    ("department", "DepartmentName"),
+    ("phone", "Phone"),
+    ("location", "Location"),
+    ("notes", "Notes"),
+    ("disabled", "Disabled"),
+])
+
+_TRUE = ("1", "true", "yes", "y")
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+class RowOutcome(namedtuple("RowOutcome", ["row", "email", "action", "user_id", "error"])):
+    """
+    Result for one input row. row is the 0-based position in the input, action one of created, updated,
+    unchanged or failed. resumed rows carry the outcome recorded in the checkpoint.
+    """
+    __slots__ = ()
+
+
+def read_users_csv(path, **kwargs):
+    """
+    :param path:    string  CSV file with a header line naming the row keys
+    :param kwargs:          (optional) passed on to csv.DictReader, e.g. delimiter=";"
+    :return:        generator of row dicts
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f, **kwargs):
+            yield {key.strip(): value for key, value in row.items() if key}
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE
+    return bool(value)
+
+
+def _group_rows(rows):
+    """
+    Splits numbered rows into groups that must run one after the other: rows sharing an email or a username
+    end up in one group, also transitively (a.email == b.email, b.username == c.username).
+
+    :param rows:    list    (number, row) in input order
+    :return:        list    of lists of (number, row), each in input order
+    """
+    parent = {}
+
+    def find(key):
+        root = key
+        while parent[root] != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    firsts = []
+    for number, row in rows:
+        keys = []
+        if row.get("email"):
+            keys.append(("email", row["email"].lower()))
+        if row.get("username"):
+            keys.append(("username", row["username"].lower()))
+        if not keys:
+            keys.append(("row", number))
+        for key in keys:
+            parent.setdefault(key, key)
+        for key in keys[1:]:
+            parent[find(key)] = find(keys[0])
+        firsts.append(keys[0])
+    groups = OrderedDict()
+    for (number, row), key in zip(rows, firsts):
+        groups.setdefault(find(key), []).append((number, row))
+    return list(groups.values())
+
+
+class UserIndex(object):
+    """
+    Users by lowercased email and username.
+    """
+
+    def __init__(self, users=()):
+        self._lock = threading.Lock()
+        self.by_email = {}
+        self.by_username = {}
+        for user in users:
+            self.add(user)
+
+    @classmethod
+    def from_api(cls, api):
+        return cls(api.iter_users(prefetch=True))
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        :param store:   TicketStore     loaded with store.load(api) or store.add_users()
+        """
+        return cls(store.find_users())
+
+    def __len__(self):
+        return len(self.by_email)
+
+    def add(self, user):
+        with self._lock:
+            if user.get("Email"):
+                self.by_email[user["Email"].lower()] = user
+            if user.get("Username"):
+                self.by_username[user["Username"].lower()] = user
+
+    def lookup(self, email=None, username=None):
+        """
+        :return:    dict    the user with this email, otherwise with this username, None if neither is known
+        """
+        user = None
+        if email:
+            user = self.by_email.get(email.lower())
+        if user is None and username:
+            user = self.by_username.get(username.lower())
+        return user
+
+
+class UserProvisioning(object):
+    checkpoint_every = 50
+
+    def __init__(self, api, checkpoint_path=None, max_workers=8, index=None, update_existing=True,
+                 reset_passwords=False):
+        """
+        :param api:                 JitBitAPI
+        :param checkpoint_path:     string      (optional) JSON file recording finished rows
+        :param max_workers:         int         (optional) rows processed in parallel. Default: 8
+        :param index:               UserIndex   (optional) existing users, e.g. UserIndex.from_store(store).
+                                                Default: built from get_users on the first run
+        :param update_existing:     bool        (optional) False leaves known users alone. Default: True
+        :param reset_passwords:     bool        (optional) also set the password column on known users. The
+                                                API doesn't return passwords, so every such row is then sent
+                                                as an update. Default: False, passwords only go to new users
+        """
+        self.api = api
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.index = index
+        self.update_existing = update_existing
+        self.reset_passwords = reset_passwords
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self.done = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path:
+            return {}
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)["done"]
+        except FileNotFoundError:
+            return {}
+
+    def _save_checkpoint(self):
+        write_json_atomic(self.checkpoint_path, {"done": self.done})
+
+    def _record(self, outcome):
+        # failed rows stay out of the checkpoint, a rerun tries them again
+        if not self.checkpoint_path or outcome.action == FAILED:
+            return
+        with self._lock:
+            self.done[str(outcome.row)] = [outcome.email, outcome.action, outcome.user_id]
+            self._pending_writes += 1
+            if self._pending_writes >= self.checkpoint_every:
+                self._save_checkpoint()
+                self._pending_writes = 0
+
+    def _changes(self, row, user):
+        changes = {}
+        for key, field in _USER_FIELDS.items():
+            if key not in row:
+                continue
+            value = _flag(row[key]) if key == "disabled" else row[key]
+            current = user.get(field)
+            if key == "disabled":
+                current = bool(current)
+            elif current is None:
+                current = ""
+            if value != current:
+                changes[key] = value
+        if self.reset_passwords and row.get("password"):
+            changes["password"] = row["password"]
+        return changes
+
+    def _update(self, number, row, user):
+        user_id = user["UserID"]
+        changes = self._changes(row, user)
+        if not changes or not self.update_existing:
+            return RowOutcome(number, row.get("email"), UNCHANGED, user_id, None)
+        # update_user_by_id overwrites every field, unchanged ones are sent with their current values
+        arguments = {key: bool(user.get(field)) if key == "disabled" else user.get(field) or ""
+                     for key, field in _USER_FIELDS.items()}
+        arguments.update(changes)
+        if self.api.update_user_by_id(user_id, **arguments):
+            self.index.add(dict(user, **{_USER_FIELDS[key]: value for key, value in changes.items()
+                                         if key in _USER_FIELDS}))
+            return RowOutcome(number, row.get("email"), UPDATED, user_id, None)
+        return RowOutcome(number, row.get("email"), FAILED, user_id, "update_user_by_id failed")
+
+    def _create(self, number, row):
+        if not all([row.get("username"), row.get("password"), row.get("email")]):
+            return RowOutcome(number, row.get("email"), FAILED, None, "new users need username, password and email")
+        user_id = self.api.create_user(row["username"], row["password"], row["email"], row.get("first_name", ""),
+                                       row.get("last_name", ""), row.get("company", ""), row.get("department", ""),
+                                       phone=row.get("phone", ""), location=row.get("location", ""),
+                                       send_welcome_email=_flag(row.get("send_welcome_email", False)))
+        if user_id is None:
+            # most likely created since the snapshot was taken, CreateUser can't tell
+            user = self.api.get_user_by_email(row["email"])
+            if user:
+                self.index.add(user)
+                return self._update(number, row, user)
+            return RowOutcome(number, row["email"], FAILED, None, "create_user failed")
+        self.index.add({"UserID": user_id, "Username": row["username"], "Email": row["email"]})
+        return RowOutcome(number, row["email"], CREATED, user_id, None)
+
+    def _process(self, number, row):
+        try:
+            user = self.index.lookup(row.get("email"), row.get("username"))
+            outcome = self._update(number, row, user) if user else self._create(number, row)
+        except Exception as exception:
+            outcome = RowOutcome(number, row.get("email"), FAILED, None, repr(exception))
+        if outcome.action == FAILED:
+            logger.warning("User import row %d (%s) failed: %s", number, outcome.email, outcome.error)
+        self._record(outcome)
+        return outcome
+
+    def _process_group(self, group):
+        return [self._process(number, row) for number, row in group]
+
+    def run(self, rows):
+        """
+        :param rows:    iterable    user dicts, e.g. read_users_csv(path)
+        :return:        list        one RowOutcome per row, in input order
+        """
+        if self.index is None:
+            self.index = UserIndex.from_api(self.api)
+            logger.info("User import resolved against %d existing users", len(self.index))
+        outcomes = []
+        pending = []
+        for number, row in enumerate(rows):
+            done = self.done.get(str(number))
+            if done and (done[0] or "").lower() == (row.get("email") or "").lower():
+                outcomes.append(RowOutcome(number, done[0], done[1], done[2], None))
+                continue
+            if done:
+                logger.info("User import row %d changed since the checkpoint, running it again", number)
+            pending.append((number, row))
+        # rows for the same email or username run in order within one group, groups run in parallel
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for group_outcomes in executor.map(self._process_group, _group_rows(pending)):
+                    outcomes.extend(group_outcomes)
+        finally:
+            if self.checkpoint_path:
+                with self._lock:
+                    self._save_checkpoint()
+        outcomes.sort(key=lambda outcome: outcome.row)
+        logger.info("User import done: %s", dict(Counter(outcome.action for outcome in outcomes)))
+        return outcomes
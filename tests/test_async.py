@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_async import AsyncJitBitAPI
+
+pytest.importorskip("aiohttp")
+
+
+@pytest.fixture
+def server():
+    with MockJitBitServer(tickets=300, users=120, payload_size=10) as server:
+        yield server
+
+
+def _run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=10))
+
+
+def test_results_match_the_sync_client(server):
+    async def fetch():
+        async with AsyncJitBitAPI(server.url, server.username, server.password) as api:
+            return await api.get_tickets(count=100), await api.get_ticket_by_id(7), await api.get_users(count=50)
+
+    with JitBitAPI(server.url, server.username, server.password) as api:
+        assert _run(fetch()) == (api.get_tickets(count=100), api.get_ticket_by_id(7), api.get_users(count=50))
+
+
+def test_requests_while_a_stream_is_open(server):
+    # a stream must not hold the only slot while its consumer awaits other requests
+    async def fetch():
+        async with AsyncJitBitAPI(server.url, server.username, server.password, max_concurrency=1) as api:
+            pairs = []
+            async for user in api.stream_users(count=20):
+                ticket = await api.get_ticket_by_id(user["UserID"])
+                pairs.append((user["UserID"], ticket["IssueID"]))
+            return pairs
+
+    assert _run(fetch()) == [(i, i) for i in range(1, 21)]
+
+
+def test_wrong_credentials(server):
+    async def fetch():
+        async with AsyncJitBitAPI(server.url, server.username, "wrong"):
+            pass
+
+    with pytest.raises(ValueError):
+        _run(fetch())
@@ -0,0 +1,67 @@
+import io
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_batch import BatchWriter
+
+
+def _queue(batch):
+    batch.update_ticket(1, statusId=3)
+    batch.update_ticket(1, assignedUserId=7, statusId=2)
+    batch.set_custom_field(1, 12, "yes")
+    batch.update_ticket(1, statusId=1)
+    batch.add_subscriber(2, 55)
+    batch.update_ticket(2, priority=1)
+    batch.update_ticket(3, tags="a,b")
+
+
+def test_plan_merges_consecutive_updates_of_a_ticket():
+    batch = BatchWriter(api=None)
+    _queue(batch)
+    plan = batch.plan()
+    assert list(plan) == [1, 2, 3]
+    assert [(call.operation, call.arguments, call.indexes) for call in plan[1]] == [
+        ("update_ticket", {"statusId": 2, "assignedUserId": 7}, [0, 1]),
+        ("set_custom_field", (12, "yes"), [2]),
+        ("update_ticket", {"statusId": 1}, [3]),
+    ]
+    assert [(call.operation, call.indexes) for call in plan[2]] == [("add_subscriber", [4]), ("update_ticket", [5])]
+    assert [call.indexes for call in plan[3]] == [[6]]
+    # planning twice gives the same plan, the queue isn't touched
+    assert [call.arguments for call in batch.plan()[1]] == [call.arguments for call in plan[1]]
+
+
+def test_flush_sends_the_plan():
+    with MockJitBitServer(tickets=10) as server, JitBitAPI(server.url, server.username, server.password) as api:
+        before = server.requests
+        with BatchWriter(api, max_workers=4) as batch:
+            _queue(batch)
+        assert server.requests - before == 6
+        assert len(batch) == 0
+        assert [result.index for result in batch.results] == list(range(7))
+        assert all(result.ok for result in batch.results)
+        # merged operations share their call's result
+        assert batch.results[0].value is batch.results[1].value is True
+
+
+def test_failed_calls_are_reported_per_operation():
+    with MockJitBitServer(tickets=10) as server, JitBitAPI(server.url, server.username, server.password) as api:
+        server.error_rate = 1.0
+        batch = BatchWriter(api)
+        batch.update_ticket(1, statusId=3)
+        batch.add_subscriber(2, 55)
+        results = batch.flush()
+        assert [(result.ok, result.value) for result in results] == [(False, False), (False, 500)]
+
+
+def test_dry_run_prints_and_sends_nothing():
+    with MockJitBitServer(tickets=10) as server, JitBitAPI(server.url, server.username, server.password) as api:
+        out = io.StringIO()
+        before = server.requests
+        with BatchWriter(api, dry_run=True, out=out) as batch:
+            _queue(batch)
+        assert server.requests == before
+        lines = out.getvalue().splitlines()
+        assert len(lines) == 6
+        assert lines[0].startswith("POST UpdateTicket")
+        assert "GET AddSubscriber?id=2&userId=55" in lines
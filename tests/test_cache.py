@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_cache import ResponseCache, RevalidationCache, SQLiteCacheBackend
+
+
+@pytest.fixture
+def server():
+    with MockJitBitServer(tickets=10, users=10, payload_size=10) as server:
+        yield server
+
+
+def _client(server, **kwargs):
+    return JitBitAPI(server.url, server.username, server.password, check_credentials=False, **kwargs)
+
+
+def test_reference_data_is_cached(server):
+    cache = ResponseCache()
+    api = _client(server, cache=cache)
+    before = server.requests
+    categories = api.get_categories()
+    assert api.get_categories() == categories
+    assert server.requests - before == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    # tickets have no TTL
+    api.get_tickets()
+    api.get_tickets()
+    assert server.requests - before == 3
+
+
+def test_writes_invalidate_what_they_affect(server):
+    api = _client(server, cache=ResponseCache())
+    api.get_companies()
+    api.get_categories()
+    before = server.requests
+    assert api.create_user("new", "secret", "new@example.com", "New", "User", "", "")
+    api.get_companies()
+    api.get_categories()
+    # CreateUser, then Companies again; Categories is still cached
+    assert server.requests - before == 2
+
+    api.get_companies()
+    api.invalidate_cache("Companies")
+    before = server.requests
+    api.get_companies()
+    assert server.requests - before == 1
+
+
+def test_concurrent_misses_send_one_request(server):
+    server.latency = 0.05
+    api = _client(server, cache=ResponseCache())
+    before = server.requests
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: api.get_categories(), range(8)))
+    assert server.requests - before == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_sqlite_backend_is_shared(server, tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = _client(server, cache=ResponseCache(backend=SQLiteCacheBackend(path)))
+    # a second process would have its own ResponseCache on the same file
+    second = _client(server, cache=ResponseCache(backend=SQLiteCacheBackend(path)))
+    companies = first.get_companies()
+    before = server.requests
+    assert second.get_companies() == companies
+    assert server.requests == before
+
+
+def test_other_credentials_dont_share_entries(server, tmp_path):
+    cache = ResponseCache(backend=SQLiteCacheBackend(str(tmp_path / "cache.sqlite")))
+    _client(server, cache=cache).get_companies()
+    wrong = JitBitAPI(server.url, server.username, "wrong", cache=cache, check_credentials="lazy")
+    with pytest.raises(ValueError):
+        wrong.get_companies()
+
+
+def test_revalidation_with_etags(server):
+    revalidation = RevalidationCache()
+    api = _client(server, revalidation=revalidation)
+    ticket = api.get_ticket_by_id(3)
+    assert api.get_ticket_by_id(3) is ticket
+    assert api.get_ticket_custom_fields_by_id(3) == api.get_ticket_custom_fields_by_id(3)
+    assert revalidation.stats() == {"records": 2, "revalidations": 2, "not_modified": 2, "unchanged": 0,
+                                    "hit_rate": 1.0}
+
+
+def test_revalidation_without_etags(server):
+    server.etags = False
+    revalidation = RevalidationCache()
+    api = _client(server, revalidation=revalidation)
+    ticket = api.get_ticket_by_id(3)
+    assert api.get_ticket_by_id(3) is ticket
+    assert (revalidation.not_modified, revalidation.unchanged) == (0, 1)
+
+
+def test_revalidation_keeps_found_records_up_to_maxsize(server):
+    revalidation = RevalidationCache(maxsize=2)
+    api = _client(server, revalidation=revalidation)
+    assert api.get_ticket_by_id(999) is None
+    for ticket_id in (1, 2, 3):
+        api.get_ticket_by_id(ticket_id)
+    assert revalidation.stats()["records"] == 2
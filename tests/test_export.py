@@ -0,0 +1,74 @@
+import csv
+import json
+import os
+
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit_export import ExportJob, Shard, shard_path
+
+
+@pytest.fixture
+def server():
+    with MockJitBitServer(tickets=250, users=30, assets=70, payload_size=10) as server:
+        yield server
+
+
+def _job(server, out_dir, **kwargs):
+    return ExportJob(server.url, server.username, server.password, str(out_dir), processes=2, threads=4, **kwargs)
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_ndjson(server, tmp_path):
+    result = _job(server, tmp_path).run()
+    assert result == {"done": {"tickets/all": 250, "users/all": 30, "companies/all": 50, "assets/all": 70},
+                      "failed": {}}
+    tickets = _lines(shard_path(str(tmp_path), Shard("all", "tickets", None, None), "ndjson"))
+    assert [ticket["IssueID"] for ticket in tickets] == list(range(1, 251))
+    assert tickets[0]["CustomFields"][0] == {"FieldID": 1, "FieldName": "Field 1", "Value": "1-1"}
+    assert len(_lines(shard_path(str(tmp_path), Shard("all", "assets", None, None), "ndjson"))) == 70
+    assert not [name for _, _, names in os.walk(str(tmp_path)) for name in names if name.endswith(".tmp")]
+
+
+def test_csv(server, tmp_path):
+    _job(server, tmp_path, format="csv", datasets=["tickets", "users"]).run()
+    with open(shard_path(str(tmp_path), Shard("all", "tickets", None, None), "csv"), encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 250
+    assert list(rows[0])[-2:] == ["CustomFields", "extra"]
+    # nested values are JSON text
+    assert json.loads(rows[0]["Tags"]) == [{"TagID": 1, "Name": "tag1"}]
+    assert json.loads(rows[0]["CustomFields"])[0]["Value"] == "1-1"
+    assert rows[0]["extra"] == ""
+
+
+def test_rerun_only_redoes_what_is_missing(server, tmp_path):
+    job = _job(server, tmp_path, datasets=["users", "companies"])
+    job.run()
+    assert _job(server, tmp_path, datasets=["users", "companies"]).pending() == []
+    # another format starts over
+    assert len(_job(server, tmp_path, format="csv", datasets=["users", "companies"]).pending()) == 2
+
+    server.error_rate = 1.0
+    result = _job(server, tmp_path, datasets=["users", "assets"], retry=None).run()
+    assert list(result["failed"]) == ["assets/all"]
+    server.error_rate = 0.0
+    job = _job(server, tmp_path, datasets=["users", "assets"])
+    assert [shard.dataset for shard in job.pending()] == ["assets"]
+    assert job.run()["failed"] == {}
+
+
+def test_shards_by_issue_date(server, tmp_path):
+    result = _job(server, tmp_path, datasets=["tickets"], date_from="2019-01-01", date_to="2020-01-01",
+                  shard_days=60, custom_fields=False).run()
+    assert len(result["done"]) == 7
+    assert sum(result["done"].values()) == 250
+    for key, written in result["done"].items():
+        name = key.split("/")[1]
+        tickets = _lines(os.path.join(str(tmp_path), "tickets", "part-%s.ndjson" % name))
+        assert len(tickets) == written
+        assert all(ticket["IssueDate"][:10] >= name for ticket in tickets)
@@ -0,0 +1,166 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+from jitbit_feed import (ASSIGNED, COMMENTED, STATS_CHANGED, STATUS_CHANGED, TICKET_CREATED, TICKET_UPDATED,
+                         ChangeFeed, SocketPublisher, listen)
+
+TODAY = date.today().isoformat()
+LAST_YEAR = (date.today() - timedelta(days=365)).isoformat()
+
+
+class StubAPI(object):
+    """
+    Serves the tickets the test puts into it, filtered by updatedfrom like the API.
+    """
+
+    def __init__(self):
+        self.tickets = {}
+        self.filters = []
+
+    def iter_tickets(self, **filters):
+        self.filters.append(filters)
+        return [dict(ticket) for ticket in self.tickets.values()
+                if ticket["LastUpdated"][:10] >= filters["updatedfrom"]]
+
+    def get_stats(self):
+        return {"TotalTickets": len(self.tickets)}
+
+    def put(self, ticket_id, issued=TODAY, time="10:00:00", **fields):
+        ticket = self.tickets.setdefault(ticket_id, {"IssueID": ticket_id, "IssueDate": issued + "T09:00:00",
+                                                     "StatusID": 1, "AssignedToUserID": None})
+        ticket.update(fields, LastUpdated="%sT%s" % (TODAY, time))
+
+
+@pytest.fixture
+def api():
+    api = StubAPI()
+    for ticket_id in (1, 2, 3):
+        api.put(ticket_id)
+    return api
+
+
+def _feed(api, **kwargs):
+    feed = ChangeFeed(api, interval=1, min_interval=1, max_interval=1, **kwargs)
+    events = []
+    feed.subscribe(events.append)
+    return feed, events
+
+
+def test_first_poll_only_takes_the_snapshot(api):
+    feed, events = _feed(api)
+    assert feed.poll() == []
+    assert events == []
+    assert sorted(feed.snapshot) == [1, 2, 3]
+    assert api.filters[0]["updatedfrom"] == (date.today() - timedelta(days=1)).isoformat()
+    assert (api.filters[0]["mode"], api.filters[0]["statusId"]) == ("all", "")
+    # an unchanged ticket of the newest day comes back and is dropped
+    assert feed.poll() == []
+    assert api.filters[1]["updatedfrom"] == TODAY
+
+
+def test_event_types(api):
+    feed, events = _feed(api)
+    feed.poll()
+    api.put(1, StatusID=2, time="11:00:00")
+    api.put(2, AssignedToUserID=7, time="11:00:00")
+    api.put(3, time="11:00:00")
+    api.put(4, time="11:00:00")
+    api.put(5, issued=LAST_YEAR, time="11:00:00")
+    assert feed.poll() == events
+    assert [(event.type, event.ticket_id) for event in events] == [
+        (STATUS_CHANGED, 1), (ASSIGNED, 2), (COMMENTED, 3), (TICKET_CREATED, 4), (TICKET_UPDATED, 5),
+        (STATS_CHANGED, None)]
+    assert events[0].previous["StatusID"] == 1
+    assert events[0].data["StatusID"] == 2
+    assert events[-1].previous == {"TotalTickets": 3}
+
+
+def test_status_and_assignment_in_one_change(api):
+    feed, events = _feed(api, stats=False)
+    feed.poll()
+    api.put(1, StatusID=3, AssignedToUserID=7, time="11:00:00")
+    assert [event.type for event in feed.poll()] == [STATUS_CHANGED, ASSIGNED]
+
+
+def test_created_after_an_empty_snapshot():
+    api = StubAPI()
+    feed, events = _feed(api, stats=False)
+    feed.poll()
+    api.put(1)
+    api.put(2, issued=LAST_YEAR)
+    assert [(event.type, event.ticket_id) for event in feed.poll()] == [(TICKET_CREATED, 1), (TICKET_UPDATED, 2)]
+
+
+def test_subscribe_by_type(api):
+    feed, events = _feed(api)
+    statuses = []
+    subscription = feed.subscribe(statuses.append, types=[STATUS_CHANGED])
+    feed.poll()
+    api.put(1, StatusID=2, time="11:00:00")
+    api.put(2, AssignedToUserID=7, time="11:00:00")
+    feed.poll()
+    assert [event.ticket_id for event in statuses] == [1]
+    assert len(events) == 2
+
+    feed.unsubscribe(subscription)
+    api.put(1, StatusID=3, time="12:00:00")
+    feed.poll()
+    assert len(statuses) == 1
+    assert len(events) == 3
+
+
+def test_failing_subscriber_doesnt_stop_the_others(api):
+    feed, events = _feed(api)
+
+    def fail(event):
+        raise RuntimeError("subscriber bug")
+
+    feed.subscribe(fail)
+    feed.poll()
+    api.put(1, StatusID=2, time="11:00:00")
+    feed.poll()
+    assert len(events) == 1
+
+
+def _wait_for_client(publisher):
+    deadline = time.monotonic() + 5
+    while not publisher.clients:
+        assert time.monotonic() < deadline, "no client connected"
+        time.sleep(0.01)
+
+
+def test_serve_and_listen(api, tmp_path):
+    address = str(tmp_path / "feed.sock")
+    feed, _ = _feed(api)
+    publisher = feed.serve(address, types=[STATUS_CHANGED])
+    feed.poll()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # listen() connects on the first next()
+        received = executor.submit(next, listen(address))
+        _wait_for_client(publisher)
+        api.put(2, AssignedToUserID=7, time="11:00:00")
+        api.put(1, StatusID=2, time="11:00:00")
+        feed.poll()
+        event = received.result(timeout=5)
+    assert (event.type, event.ticket_id, event.data["StatusID"]) == (STATUS_CHANGED, 1, 2)
+    feed.stop()
+    assert not os.path.exists(address)
+
+
+def test_publisher_replaces_only_a_stale_socket(tmp_path):
+    address = str(tmp_path / "feed.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address)
+    stale.close()
+    SocketPublisher(address).close()
+
+    path = tmp_path / "feed.txt"
+    path.write_text("not a socket")
+    with pytest.raises(OSError):
+        SocketPublisher(str(path))
+    assert path.read_text() == "not a socket"
@@ -0,0 +1,22 @@
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_store import TicketStore
+from jitbit_sync import TicketSync
+
+
+def test_refresh_resumes_after_crash(tmp_path):
+    state_path = str(tmp_path / "sync.json")
+    with MockJitBitServer(tickets=1000, payload_size=10) as server, \
+            JitBitAPI(server.url, server.username, server.password) as api, \
+            TicketStore(str(tmp_path / "tickets.sqlite")) as store:
+        # a refresh that dies before it stored its fourth page
+        for number, page in enumerate(TicketSync(api, state_path).pages()):
+            if number == 3:
+                break
+            store.add_tickets(page)
+        assert len(store.find_tickets()) == 300
+
+        assert store.refresh(api, state_path) == 700
+        assert len(store.find_tickets()) == 1000
+        # nothing left to pull once the run completed
+        assert store.refresh(api, state_path, overlap_days=0) == 0
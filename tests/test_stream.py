@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_stream import JSONArraySplitter
+
+RECORDS = [
+    {"IssueID": 1, "Subject": "brackets ] [ and braces } { in a string", "Tags": [{"TagID": 1, "Name": "a,b"}]},
+    {"IssueID": 2, "Subject": 'escaped \\" quote, backslash \\\\ and "quotes"', "Body": "\\"},
+    {"IssueID": 3, "Subject": "non-ASCII: Grüße, 日本語", "Nested": {"list": [[], [1, [2, {}]]], "empty": ""}},
+    [],
+    {},
+    "plain string",
+    42,
+    None,
+]
+
+
+def _split(body, chunk_size):
+    splitter = JSONArraySplitter()
+    records = []
+    for start in range(0, len(body), chunk_size):
+        records.extend(splitter.feed(body[start:start + chunk_size]))
+    splitter.close()
+    return records
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 13, 64, 1 << 20])
+def test_splits_at_any_chunk_boundary(chunk_size):
+    body = json.dumps(RECORDS, ensure_ascii=False).encode()
+    assert _split(body, chunk_size) == RECORDS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 20])
+def test_whitespace_between_elements(chunk_size):
+    body = json.dumps(RECORDS, indent=4).encode().replace(b"[", b"\n [ \n", 1)
+    assert _split(body, chunk_size) == RECORDS
+
+
+@pytest.mark.parametrize("body", [b"[]", b"  [ ]  ", b"[\n]"])
+def test_empty_array(body):
+    assert _split(body, 1) == []
+
+
+def test_truncated_array_fails_on_close():
+    splitter = JSONArraySplitter()
+    assert splitter.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    with pytest.raises(ValueError):
+        splitter.close()
+
+
+def test_rejects_anything_but_an_array():
+    with pytest.raises(ValueError):
+        JSONArraySplitter().feed(b'{"a": 1}')
+
+
+def test_stream_matches_get():
+    with MockJitBitServer(tickets=300, users=120, payload_size=10) as server, \
+            JitBitAPI(server.url, server.username, server.password) as api:
+        assert list(api.stream_tickets(count=100)) == api.get_tickets(count=100)
+        assert list(api.stream_users(count=50, page=2)) == api.get_users(count=50, page=2)
@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_sync import TicketSync
+
+
+@pytest.fixture
+def api():
+    with MockJitBitServer(tickets=1000, payload_size=10) as server, \
+            JitBitAPI(server.url, server.username, server.password) as api:
+        yield api
+
+
+def test_run_and_rerun(api, tmp_path):
+    state_path = str(tmp_path / "sync.json")
+    synced = []
+    sync = TicketSync(api, state_path)
+    assert sync.run(synced.append) == 1000
+    assert len({ticket["IssueID"] for ticket in synced}) == 1000
+    assert sync.watermark == max(ticket["LastUpdated"] for ticket in synced)
+    # the overlap brings back tickets the last run already handed over
+    assert TicketSync(api, state_path).run(synced.append) == 0
+
+
+def test_resume_at_the_last_unfinished_page(api, tmp_path):
+    state_path = str(tmp_path / "sync.json")
+    stored = []
+    for number, page in enumerate(TicketSync(api, state_path).pages()):
+        if number == 3:
+            break
+        stored.extend(page)
+    assert len(stored) == 300
+    assert TicketSync(api, state_path).watermark is None
+
+    resumed = list(TicketSync(api, state_path).changes())
+    assert len(resumed) == 700
+    assert {ticket["IssueID"] for ticket in stored + resumed} == set(range(1, 1001))
+
+
+def test_reserved_filters(api, tmp_path):
+    with pytest.raises(AssertionError):
+        TicketSync(api, str(tmp_path / "sync.json"), statusId=1)
+    with pytest.raises(AssertionError):
+        TicketSync(api, str(tmp_path / "sync.json"), updatedFrom="2020-01-01")
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI, JitBitAPIError
+from jitbit_throttle import CircuitBreaker, CircuitOpenError, QuotaLimiter, RetryPolicy, TokenBucket
+
+FAST_RETRIES = RetryPolicy(max_retries=2, backoff_factor=0.001)
+
+
+@pytest.fixture
+def server():
+    with MockJitBitServer(tickets=10, payload_size=10) as server:
+        yield server
+
+
+def _client(server, **kwargs):
+    return JitBitAPI(server.url, server.username, server.password, check_credentials=False, **kwargs)
+
+
+def _requests_for(server, call):
+    before = server.requests
+    try:
+        call()
+    except (JitBitAPIError, CircuitOpenError):
+        pass
+    return server.requests - before
+
+
+def test_reads_are_retried(server):
+    api = _client(server, retry=FAST_RETRIES)
+    server.error_rate = 1.0
+    with pytest.raises(JitBitAPIError):
+        api.get_stats()
+    assert _requests_for(server, api.get_stats) == 3
+    server.throttle_rate = 1.0
+    assert _requests_for(server, api.get_stats) == 3
+
+
+def test_writes_are_only_retried_when_allowed(server):
+    api = _client(server, retry=FAST_RETRIES)
+    server.error_rate = 1.0
+    assert _requests_for(server, lambda: api.update_ticket(1, statusId=2)) == 1
+    # GETs that change data count as writes
+    assert _requests_for(server, lambda: api.merge_tickets(1, 2)) == 1
+    assert _requests_for(server, lambda: api.add_subscriber_by_id(1, 2)) == 1
+    with api.retrying_writes():
+        assert _requests_for(server, lambda: api.update_ticket(1, statusId=2)) == 3
+        assert _requests_for(server, lambda: api.merge_tickets(1, 2)) == 3
+    with api.retrying_writes(guard=lambda method, data: False):
+        assert _requests_for(server, lambda: api.update_ticket(1, statusId=2)) == 1
+
+
+def test_circuit_breaker_opens_and_closes(server):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+    api = _client(server, retry=None, circuit_breaker=breaker)
+    server.error_rate = 1.0
+    for _ in range(3):
+        assert _requests_for(server, api.get_stats) == 1
+    # open: fails fast without a request
+    with pytest.raises(CircuitOpenError):
+        api.get_stats()
+    assert _requests_for(server, api.get_stats) == 0
+
+    # the trial after reset_timeout fails, the circuit stays open
+    time.sleep(0.25)
+    assert _requests_for(server, api.get_stats) == 1
+    with pytest.raises(CircuitOpenError):
+        api.get_stats()
+
+    server.error_rate = 0.0
+    time.sleep(0.25)
+    assert api.get_stats()["TotalTickets"] == 10
+    assert api.get_stats()["TotalTickets"] == 10
+    assert breaker.opened_at is None
+
+
+def test_trial_is_handed_back_when_it_raises(server, tmp_path):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    api = _client(server, retry=None, circuit_breaker=breaker)
+    wrong = JitBitAPI(server.url, server.username, "wrong", check_credentials="lazy", circuit_breaker=breaker)
+    server.error_rate = 1.0
+    _requests_for(server, api.get_stats)
+    server.error_rate = 0.0
+    time.sleep(0.15)
+    # the trial ends in the credential check before its outcome is booked
+    with pytest.raises(ValueError):
+        wrong.download_attachment(1, str(tmp_path / "file"))
+    assert api.get_stats()["TotalTickets"] == 10
+    assert breaker.opened_at is None
+
+
+def test_429_only_penalizes_the_own_quota(server):
+    shared = TokenBucket(rate=1000)
+    own = TokenBucket(rate=100)
+    api = _client(server, retry=None, rate_limiter=QuotaLimiter(own, shared))
+    server.throttle_rate = 1.0
+    _requests_for(server, api.get_stats)
+    assert own.rate == 50
+    assert shared.rate == 1000
+
+    api = _client(server, retry=None, rate_limiter=QuotaLimiter(None, shared))
+    _requests_for(server, api.get_stats)
+    assert shared.rate == 1000
+
+
+def test_token_bucket_paces_requests(server):
+    api = _client(server, rate_limiter=TokenBucket(rate=50, burst=1))
+    started = time.monotonic()
+    for _ in range(11):
+        api.get_stats()
+    assert time.monotonic() - started >= 0.19
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_transfer import content_range
+
+SIZE = 100000
+
+
+@pytest.fixture
+def server():
+    with MockJitBitServer(tickets=10, attachment_size=SIZE) as server:
+        yield server
+
+
+@pytest.fixture
+def api(server):
+    with JitBitAPI(server.url, server.username, server.password) as api:
+        yield api
+
+
+@pytest.fixture
+def attachment(api, tmp_path):
+    path = tmp_path / "reference"
+    api.download_attachment(5, str(path))
+    return path.read_bytes()
+
+
+def _download(server, api, path, part=None, **kwargs):
+    if part is not None:
+        path.with_name(path.name + ".part").write_bytes(part)
+    before = server.requests
+    assert api.download_attachment(5, str(path), **kwargs) == str(path)
+    assert not path.with_name(path.name + ".part").exists()
+    return server.requests - before
+
+
+def test_download_reports_progress(server, api, attachment, tmp_path):
+    assert len(attachment) == SIZE
+    progress = []
+    path = tmp_path / "file"
+    assert _download(server, api, path, progress=lambda done, total: progress.append((done, total)),
+                     chunk_size=30000) == 1
+    assert path.read_bytes() == attachment
+    assert progress == [(30000, SIZE), (60000, SIZE), (90000, SIZE), (SIZE, SIZE)]
+
+
+def test_download_resumes_from_the_part_file(server, api, attachment, tmp_path):
+    progress = []
+    path = tmp_path / "file"
+    assert _download(server, api, path, attachment[:1000], progress=lambda done, total: progress.append(done)) == 1
+    assert path.read_bytes() == attachment
+    assert progress[0] > 1000
+
+
+def test_complete_part_file_is_kept(server, api, attachment, tmp_path):
+    path = tmp_path / "file"
+    # the Range request past the end is answered with 416 and the size, which matches
+    assert _download(server, api, path, attachment) == 1
+    assert path.read_bytes() == attachment
+
+
+def test_too_long_part_file_is_downloaded_again(server, api, attachment, tmp_path):
+    path = tmp_path / "file"
+    assert _download(server, api, path, attachment + b"garbage") == 2
+    assert path.read_bytes() == attachment
+
+
+def test_attach_file(server, api, tmp_path):
+    path = tmp_path / "upload.bin"
+    path.write_bytes(b"x" * 5000)
+    progress = []
+    assert api.attach_file(1, str(path), progress=lambda sent, total: progress.append((sent, total))) is True
+    # the whole multipart body went out, file and form fields
+    assert progress[-1][0] == progress[-1][1] == server.uploaded_bytes > 5000
+    before = server.uploaded_bytes
+    assert api.attach_file(1, io.BytesIO(b"y" * 300), filename="memory.bin") is True
+    assert server.uploaded_bytes - before > 300
+
+
+class _Response(object):
+    def __init__(self, value=None):
+        self.headers = {} if value is None else {"Content-Range": value}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("bytes 100-199/200", (100, 200)),
+    ("bytes 100-199/*", (100, None)),
+    ("bytes */200", (None, 200)),
+    ("pages 1-2/3", (None, None)),
+    (None, (None, None)),
+])
+def test_content_range(value, expected):
+    assert content_range(_Response(value)) == expected
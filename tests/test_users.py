@@ -0,0 +1,79 @@
+import pytest
+
+from benchmarks.mock_server import MockJitBitServer
+from jitbit import JitBitAPI
+from jitbit_users import CREATED, FAILED, UNCHANGED, UPDATED, UserIndex, UserProvisioning, read_users_csv
+
+ROWS = [
+    # known and unchanged, the password alone doesn't make it an update
+    {"username": "user3", "email": "user3@example.com", "first_name": "First3", "last_name": "Last3",
+     "password": "secret"},
+    {"username": "user4", "email": "USER4@example.com", "last_name": "Renamed"},
+    {"username": "new1", "email": "new1@example.com", "password": "secret", "first_name": "New"},
+    {"username": "new2", "email": "new2@example.com"},
+    # same email as the row before the last, runs after it and finds the created user
+    {"email": "new1@example.com", "first_name": "Changed"},
+]
+
+
+@pytest.fixture
+def server():
+    with MockJitBitServer(tickets=10, users=20) as server:
+        yield server
+
+
+@pytest.fixture
+def api(server):
+    with JitBitAPI(server.url, server.username, server.password) as api:
+        yield api
+
+
+def test_upsert(api):
+    outcomes = UserProvisioning(api, max_workers=4).run(ROWS)
+    assert [(outcome.row, outcome.action) for outcome in outcomes] == [
+        (0, UNCHANGED), (1, UPDATED), (2, CREATED), (3, FAILED), (4, UPDATED)]
+    assert outcomes[0].user_id == 3
+    assert outcomes[2].user_id == outcomes[4].user_id == 21
+    assert "password" in outcomes[3].error
+
+
+def test_reset_passwords_updates_known_users(api):
+    outcomes = UserProvisioning(api, reset_passwords=True).run(ROWS[:1])
+    assert outcomes[0].action == UPDATED
+
+
+def test_update_existing_false_leaves_known_users_alone(server, api):
+    index = UserIndex.from_api(api)
+    before = server.requests
+    outcomes = UserProvisioning(api, index=index, update_existing=False).run(ROWS[1:2])
+    assert outcomes[0].action == UNCHANGED
+    assert server.requests == before
+
+
+def test_resume_only_runs_what_is_left(server, api, tmp_path):
+    checkpoint = str(tmp_path / "import.json")
+    UserProvisioning(api, checkpoint_path=checkpoint).run(ROWS)
+
+    index = UserIndex.from_api(api)
+    before = server.requests
+    outcomes = UserProvisioning(api, checkpoint_path=checkpoint, index=index).run(ROWS)
+    assert [outcome.action for outcome in outcomes] == [UNCHANGED, UPDATED, CREATED, FAILED, UPDATED]
+    # the failed row isn't checkpointed, it fails again without a request
+    assert server.requests == before
+
+    rows = list(ROWS)
+    rows[3] = dict(rows[3], password="secret")
+    # a different email at a recorded position runs again
+    rows[1] = dict(rows[1], email="user5@example.com", username="user5")
+    outcomes = UserProvisioning(api, checkpoint_path=checkpoint, index=index).run(rows)
+    assert [outcome.action for outcome in outcomes] == [UNCHANGED, UPDATED, CREATED, CREATED, UPDATED]
+    assert outcomes[1].user_id == 5
+    # UpdateUser for user5 and CreateUser for the fixed row
+    assert server.requests - before == 2
+
+
+def test_read_users_csv(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text("\ufeffusername; email ;first_name\nuser3;user3@example.com;First3\n", encoding="utf-8")
+    assert list(read_users_csv(str(path), delimiter=";")) == [
+        {"username": "user3", "email": "user3@example.com", "first_name": "First3"}]